@@ -0,0 +1,237 @@
+# allergens.py — which residents can't eat which menus.
+# Residents' free-text allergies and inventory item names are tokenized once
+# and kept in memory: an inverted index allergen token -> residents, plus each
+# menu's item ids. A menu's conflicts are computed on first request and cached,
+# so pages look them up in constant time. ORM events keep everything current:
+# row-level changes are applied from the flushed objects on commit, bulk
+# statements trigger a rebuild (three queries) on the next lookup.
+
+import os
+import re
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import inspect
+
+from commitsync import CommitSync
+from models import db, Resident, InventoryItem, Menu, MenuIngredient
+
+# Words in an allergies field that never name an allergen.
+STOPWORDS = {
+    "a", "allergic", "allergies", "allergy", "and", "any", "food", "foods", "intolerance",
+    "intolerant", "known", "mild", "moderate", "n", "na", "nka", "nkda", "nkfa", "no", "none",
+    "of", "or", "reaction", "severe", "sensitive", "sensitivity", "the", "to", "with",
+}
+
+# An allergy to the key also rules out ingredients named with any of these.
+EXPANSIONS = {
+    "dairy": {"milk", "cheese", "butter", "yogurt", "yoghurt", "cream", "lactose", "whey"},
+    "lactose": {"milk", "cheese", "butter", "yogurt", "yoghurt", "cream"},
+    "milk": {"cheese", "butter", "yogurt", "yoghurt", "cream", "whey"},
+    "gluten": {"wheat", "flour", "bread", "pasta", "barley", "rye", "noodle", "cracker"},
+    "wheat": {"flour", "bread", "pasta", "noodle", "cracker"},
+    "shellfish": {"shrimp", "crab", "lobster", "prawn", "scallop", "clam", "mussel", "oyster"},
+    "nut": {"almond", "walnut", "pecan", "cashew", "hazelnut", "pistachio", "macadamia"},
+    "treenut": {"almond", "walnut", "pecan", "cashew", "hazelnut", "pistachio", "macadamia"},
+    "fish": {"salmon", "tuna", "cod", "tilapia", "halibut", "trout", "haddock", "sardine"},
+    "egg": {"mayonnaise", "mayo"},
+    "soy": {"tofu", "soybean", "edamame"},
+    "sesame": {"tahini"},
+}
+
+_WORD = re.compile(r"[a-z]+")
+
+def _stem(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def tokens(text):
+    """Stemmed, lower-cased words of `text`: "Peanuts, eggs" -> {"peanut", "egg"}."""
+    text = (text or "").lower().replace("tree nut", "treenut")
+    return frozenset(_stem(w) for w in _WORD.findall(text) if w not in STOPWORDS)
+
+
+def allergen_tokens(allergies):
+    """A resident's allergen tokens, expanded to the ingredient words they rule out."""
+    base = tokens(allergies)
+    out = set(base)
+    for t in base:
+        out |= EXPANSIONS.get(t, set())
+    return frozenset(out)
+
+
+def resident_label(r):
+    return f"{r.last_name}, {r.first_name}"
+
+
+class AllergenIndex:
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._built_at = 0.0
+        self._residents = None             # {resident_id: (label, tokens)}
+        self._by_token = defaultdict(set)  # {token: {resident_id}}
+        self._items = {}                   # {inventory_id: (name, tokens)}
+        self._menus = {}                   # {menu_id: {inventory_id}}
+        self._dirty_menus = set()          # menus whose ingredients must be reloaded
+        self._conflicts = {}               # {menu_id: [conflict, ...]} cache
+
+    # ---- building ----
+    def _build(self):
+        self._residents, self._by_token = {}, defaultdict(set)
+        for rid, first, last, allergies in db.session.query(
+                Resident.id, Resident.first_name, Resident.last_name, Resident.allergies
+        ).filter(Resident.allergies.isnot(None), Resident.allergies != ""):
+            self._set_resident(rid, (f"{last}, {first}", allergen_tokens(allergies)))
+        self._items = {iid: (name, tokens(name))
+                       for iid, name in db.session.query(InventoryItem.id, InventoryItem.name)}
+        self._menus = defaultdict(set)
+        for mid, iid in db.session.query(MenuIngredient.menu_id, MenuIngredient.inventory_id):
+            self._menus[mid].add(iid)
+        self._menus = dict(self._menus)
+        self._dirty_menus.clear()
+        self._conflicts.clear()
+        self._built_at = time.time()
+
+    def _set_resident(self, rid, value):
+        old = self._residents.pop(rid, None)
+        if old:
+            for t in old[1]:
+                self._by_token[t].discard(rid)
+        if value and value[1]:
+            self._residents[rid] = value
+            for t in value[1]:
+                self._by_token[t].add(rid)
+
+    def _reload_menus(self):
+        ids = self._dirty_menus
+        self._dirty_menus = set()
+        for mid in ids:
+            self._menus.pop(mid, None)
+            self._conflicts.pop(mid, None)
+        for mid, iid in (db.session.query(MenuIngredient.menu_id, MenuIngredient.inventory_id)
+                         .filter(MenuIngredient.menu_id.in_(ids))):
+            self._menus.setdefault(mid, set()).add(iid)
+
+    def _ensure(self):
+        if self._residents is None or time.time() - self._built_at > self.max_age:
+            self._build()
+        elif self._dirty_menus:
+            self._reload_menus()
+
+    # ---- lookups ----
+    def conflicts(self, menu_id):
+        """
+        Residents who can't eat this menu, sorted by name:
+        [{"resident_id", "resident", "items": [item names]}]
+        """
+        if not menu_id:
+            return []
+        with self._lock:
+            self._ensure()
+            hit = self._conflicts.get(menu_id)
+            if hit is None:
+                found = defaultdict(set)
+                for iid in self._menus.get(menu_id, ()):
+                    name, toks = self._items.get(iid, ("", ()))
+                    for t in toks:
+                        for rid in self._by_token.get(t, ()):
+                            found[rid].add(name)
+                hit = sorted(({"resident_id": rid, "resident": self._residents[rid][0],
+                               "items": sorted(names)} for rid, names in found.items()),
+                             key=lambda c: c["resident"].lower())
+                self._conflicts[menu_id] = hit
+            return hit
+
+    def conflicts_for(self, menu_ids):
+        return {mid: self.conflicts(mid) for mid in set(menu_ids) if mid}
+
+    # ---- incremental updates (called after commit) ----
+    def apply(self, changes, stale):
+        with self._lock:
+            if stale or self._residents is None:
+                self._residents = None
+                return
+            for kind, key, value in changes:
+                if kind == "resident":
+                    self._set_resident(key, value)
+                    self._conflicts.clear()
+                elif kind == "item":
+                    if value is None:
+                        self._items.pop(key, None)
+                    else:
+                        self._items[key] = value
+                    for mid, iids in self._menus.items():
+                        if key in iids:
+                            self._conflicts.pop(mid, None)
+                elif kind == "menu":
+                    self._dirty_menus.add(key)
+
+
+# -------------------------- ORM event wiring --------------------------
+_sync = CommitSync("allergens")
+
+
+def _on_resident(mapper, connection, target):
+    _sync.change(target, ("resident", target.id, (resident_label(target), allergen_tokens(target.allergies))))
+
+
+def _on_resident_delete(mapper, connection, target):
+    _sync.change(target, ("resident", target.id, None))
+
+
+def _on_item(mapper, connection, target):
+    if not inspect(target).attrs.name.history.has_changes():
+        return  # quantity edits, bumps, ...
+    _sync.change(target, ("item", target.id, (target.name, tokens(target.name))))
+
+
+def _on_item_delete(mapper, connection, target):
+    _sync.change(target, ("item", target.id, None))
+
+
+def _on_ingredient(mapper, connection, target):
+    _sync.change(target, ("menu", target.menu_id, None))
+
+
+def _on_menu_delete(mapper, connection, target):
+    _sync.change(target, ("menu", target.id, None))
+
+
+_BULK = {Resident, InventoryItem, Menu, MenuIngredient}
+
+
+def _on_orm_execute(state):
+    # Bulk INSERT/UPDATE/DELETE statements skip the mapper events above.
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    if any(mapper.class_ in _BULK for mapper in state.all_mappers):
+        _sync.stale(state.session, "index")
+
+
+def _wire_events():
+    _sync.wire([
+        (Resident, "after_insert", _on_resident),
+        (Resident, "after_update", _on_resident),
+        (Resident, "after_delete", _on_resident_delete),
+        (InventoryItem, "after_insert", _on_item),
+        (InventoryItem, "after_update", _on_item),
+        (InventoryItem, "after_delete", _on_item_delete),
+        *((MenuIngredient, name, _on_ingredient) for name in ("after_insert", "after_update", "after_delete")),
+        (Menu, "after_delete", _on_menu_delete),
+    ], on_execute=_on_orm_execute)
+
+
+def init_app(app):
+    app.config.setdefault("ALLERGEN_INDEX_MAX_AGE", int(os.getenv("ALLERGEN_INDEX_MAX_AGE", "300")))
+    _wire_events()
+    idx = _sync.register(AllergenIndex(max_age=app.config["ALLERGEN_INDEX_MAX_AGE"]))
+    app.extensions["allergens"] = idx
+    return idx
@@ -2,26 +2,48 @@
 # Inventory, Residents, Staff, Dashboard, and strong pre-checks before deductions.
 # Weekly grid FIX: days objects now include {"dow", "date"} to match planned_menu_week.html.
 
-import os, io, csv
+import hashlib, math, os, time
 from functools import wraps
 from datetime import datetime, timedelta, date
 from collections import defaultdict
 
 from flask import (
     Flask, render_template, request, redirect, url_for,
-    session, send_file, flash, jsonify
+    session, flash, jsonify,
+    get_flashed_messages, stream_template
 )
 from flask_migrate import Migrate
-from openai import OpenAI
 import json
 from sqlalchemy import or_, func   # func used by CSV export filters
+from sqlalchemy.orm import joinedload, selectinload
 
 # models.py must be in the same folder
 from models import (
-    db, User, Resident, InventoryItem,
+    db, User, Resident, InventoryItem, PackSize, is_low_stock,
     # New menu system models
     Menu, MenuIngredient, MenuSchedule, MenuScheduleItem
 )
+import chatbot
+import kitchen_context
+from search import search_residents
+from exports import (
+    csv_response, inventory_rows, resident_rows, schedule_rows,
+    INVENTORY_HEADER, RESIDENT_HEADER, SCHEDULE_HEADER,
+)
+from pagination import KeysetPage, RankedPage, decode_cursor, per_page_arg
+from scheduling import (
+    held_usage, plan_requirements, apply_deductions, save_schedules, ledger_rows,
+)
+import ledger
+import intake
+import forecast
+import units
+import allergens
+import traycards
+import pagecache
+import dbconfig
+import replica
+import seed
 
 # Optional .env
 try:
@@ -51,9 +73,16 @@ def _calc_age(bday):
 
 def _to_float(v, default=0.0):
     try:
-        return float(v)
+        f = float(v)
     except Exception:
         return default
+    return f if math.isfinite(f) else default
+
+def _to_int(v, default=None):
+    try:
+        return int(v)
+    except (TypeError, ValueError):
+        return default
 
 def model_has_column(model, name):
     try:
@@ -115,7 +144,11 @@ def create_app():
     app.jinja_env.auto_reload = True
     os.makedirs(os.path.join(os.getcwd(), "instance"), exist_ok=True)
 
+    dbconfig.configure(app)
+    replica.configure(app)
     db.init_app(app)
+    dbconfig.init_app(app, db)
+    replica.init_app(app, db)
     Migrate(app, db)
     register_age_helper(app)
 
@@ -123,13 +156,32 @@ def create_app():
         "kg", "g", "bags", "cases", "dozen", "cans", "liters", "jugs",
         "bunches", "heads", "loaves", "packs", "bottles", "jars", "boxes", "pcs"
     ]
+    unit_table = units.init_app(app, INVENTORY_UNITS)
+    allergen_idx = allergens.init_app(app)
+    page_cache = pagecache.init_app(app)
+    inventory_cli = ledger.register_cli(app)
+    intake.register_cli(inventory_cli, INVENTORY_UNITS)
+    seed.register_cli(app, INVENTORY_UNITS)
     ROLES = ["Manager", "Cook", "Dietitian", "Dietary Aide"]
+    app.config.setdefault("STREAM_LIST_PAGES", os.getenv("STREAM_LIST_PAGES", "0") == "1")
 
     # Make `current_user` available in all templates
     @app.context_processor
     def inject_current_user():
         return {"current_user": session.get("user")}
 
+    def render_list(template, **ctx):
+        """
+        Render a list page. With ?stream=1 (or STREAM_LIST_PAGES) the template is
+        streamed, so the first rows go out while later ones are still loading.
+        """
+        stream = request.args.get("stream", "1" if app.config["STREAM_LIST_PAGES"] else "0") == "1"
+        if not stream:
+            return render_template(template, **ctx)
+        # Pop flashes now: the session cookie can't change once headers are sent.
+        get_flashed_messages()
+        return app.response_class(stream_template(template, **ctx), mimetype="text/html")
+
     # ---------------- guards ----------------
     def login_required(f):
         @wraps(f)
@@ -142,6 +194,9 @@ def create_app():
     def current_role():
         return session.get("user", {}).get("role")
 
+    def current_user_id():
+        return session.get("user", {}).get("id")
+
     def roles_required(*roles):
         def decorate(f):
             @wraps(f)
@@ -154,16 +209,37 @@ def create_app():
             return wrapped
         return decorate
 
+    # The must_change_password flag travels in the signed session so the normal
+    # request path does no user lookup. Changes made by this user update the
+    # session directly; changes made by someone else (a manager resetting a
+    # password) are picked up when the session is re-validated after
+    # PW_FLAG_TTL seconds.
+    app.config.setdefault("PW_FLAG_TTL", int(os.getenv("PW_FLAG_TTL", "300")))
+
+    def session_user_for(user):
+        return {
+            "id": user.id,
+            "username": user.username,
+            "role": user.role,
+            "first_name": getattr(user, "first_name", "") or "",
+            "last_name": getattr(user, "last_name", "") or "",
+            "must_change_password": bool(getattr(user, "must_change_password", False)),
+            "checked_at": int(time.time()),
+        }
+
     @app.before_request
     def enforce_pw_change():
         allowed = {"login", "logout", "change_password", "static"}
         u = session.get("user")
         if not u:
             return
-        obj = User.query.get(u["id"])
-        if obj and getattr(obj, "must_change_password", False):
-            if request.endpoint not in allowed:
-                return redirect(url_for("change_password"))
+        now = int(time.time())
+        if "must_change_password" not in u or now - u.get("checked_at", 0) > app.config["PW_FLAG_TTL"]:
+            obj = db.session.get(User, u["id"])
+            if obj:
+                u = session["user"] = session_user_for(obj)
+        if u.get("must_change_password") and request.endpoint not in allowed:
+            return redirect(url_for("change_password"))
 
     # ---------------- auth ----------------
     @app.route("/login", methods=["GET", "POST"])
@@ -175,13 +251,7 @@ def create_app():
                 or_(User.username.ilike(username), User.employee_id.ilike(username))
             ).first()
             if user and user.check_password(password):
-                session["user"] = {
-                    "id": user.id,
-                    "username": user.username,
-                    "role": user.role,
-                    "first_name": getattr(user, "first_name", "") or "",
-                    "last_name": getattr(user, "last_name", "") or "",
-                }
+                session["user"] = session_user_for(user)
                 if getattr(user, "must_change_password", False):
                     return redirect(url_for("change_password"))
                 return redirect(url_for("dashboard"))
@@ -211,6 +281,7 @@ def create_app():
                 user.set_password(new)
                 user.must_change_password = False
                 db.session.commit()
+                session["user"] = session_user_for(user)
                 flash("Password updated.", "success")
                 return redirect(url_for("dashboard"))
         return render_template("change_password.html", error=error)
@@ -225,7 +296,7 @@ def create_app():
     def dashboard():
         role = session.get("user", {}).get("role")
         tiles = dashboard_tiles_for(role)
-        return render_template("dashboard.html", tiles=tiles)
+        return render_template("dashboard.html", tiles=tiles, low_stock_count=kitchen_ctx.low_stock_count())
 
 
     # ======================================================================
@@ -235,24 +306,21 @@ def create_app():
     @login_required
     def residents_list():
         q = (request.args.get("q") or "").strip()
-        query = Resident.query
+        after = decode_cursor(request.args.get("after"))
+        per_page = per_page_arg(request.args.get("per_page"))
         if q:
-            like = f"%{q}%"
-            filters = []
-            if hasattr(Resident, "first_name"):  filters.append(Resident.first_name.ilike(like))
-            if hasattr(Resident, "last_name"):   filters.append(Resident.last_name.ilike(like))
-            if hasattr(Resident, "diet"):        filters.append(Resident.diet.ilike(like))
-            if hasattr(Resident, "allergies"):   filters.append(Resident.allergies.ilike(like))
-            if hasattr(Resident, "illnesses"):   filters.append(Resident.illnesses.ilike(like))
-            if hasattr(Resident, "medications"): filters.append(Resident.medications.ilike(like))
-            if hasattr(Resident, "fluids"):      filters.append(Resident.fluids.ilike(like))
-            if filters:
-                query = query.filter(or_(*filters))
-        residents = query.order_by(
-            getattr(Resident, "last_name", Resident.id),
-            getattr(Resident, "first_name", Resident.id),
-        ).all()
-        return render_template("residents_list.html", residents=residents, q=q)
+            # Ranked full-text search (FTS5 / tsvector)
+            query = search_residents(q).order_by(Resident.last_name, Resident.first_name, Resident.id)
+            page = RankedPage(query, after, per_page)
+        else:
+            page = KeysetPage(
+                Resident.query,
+                [Resident.last_name, Resident.first_name, Resident.id],
+                lambda r: [r.last_name, r.first_name, r.id],
+                after, per_page,
+            )
+        return render_list("residents_list.html", residents=page, page=page, q=q,
+                           pager_args={"q": q} if q else {})
 
     @app.route("/residents/new", methods=["GET", "POST"])
     @login_required
@@ -285,6 +353,7 @@ def create_app():
                 r.age = _calc_age(birthday)
             db.session.add(r)
             db.session.commit()
+            page_cache.invalidate()  # allergy conflicts on the planned views
             flash("Resident created.", "success")
             return redirect(url_for("residents_list"))
 
@@ -327,6 +396,7 @@ def create_app():
                 r.age = _calc_age(birthday)
 
             db.session.commit()
+            page_cache.invalidate()
             flash("Resident updated.", "success")
             return redirect(url_for("residents_list"))
 
@@ -350,6 +420,7 @@ def create_app():
         r = Resident.query.get_or_404(rid)
         db.session.delete(r)
         db.session.commit()
+        page_cache.invalidate()
         flash("Resident deleted.", "success")
         return redirect(url_for("residents_list"))
 
@@ -360,6 +431,29 @@ def create_app():
         auto = bool(request.args.get("auto"))
         return render_template("resident_print.html", r=r, auto_print=auto)
 
+    @app.route("/residents/print")
+    @login_required
+    def residents_print_batch():
+        """Tray cards for every resident (or those matching ?q=) for ?date=, streamed."""
+        d = _parse_date(request.args.get("date")) or date.today()
+        q = (request.args.get("q") or "").strip()
+        meals = traycards.day_menus(d)
+        cards = traycards.tray_cards(meals, allergen_idx, q)
+        # Always streamed: the first cards render while later residents load.
+        get_flashed_messages()
+        return app.response_class(
+            stream_template("resident_print_batch.html", cards=cards, day_value=d, q=q,
+                            auto_print=bool(request.args.get("auto"))),
+            mimetype="text/html",
+        )
+
+    @app.route("/residents/export.csv")
+    @login_required
+    @roles_required("Manager", "Dietitian")
+    def residents_export():
+        """Export every resident as CSV (streamed)."""
+        return csv_response(f"residents_{date.today():%Y%m%d}.csv", RESIDENT_HEADER, resident_rows())
+
     # ======================================================================
     # Staff (Manager only)
     # ======================================================================
@@ -381,8 +475,15 @@ def create_app():
                 User.employee_id.ilike(like),
                 User.email.ilike(like),
             ))
-        users = query.order_by(User.last_name, User.first_name, User.username).all()
-        return render_template("staff_list.html", users=users, roles=ROLES, role_filter=role_filter, q=q)
+        page = KeysetPage(
+            query,
+            [func.coalesce(User.last_name, ""), func.coalesce(User.first_name, ""), User.username],
+            lambda u: [u.last_name or "", u.first_name or "", u.username],
+            decode_cursor(request.args.get("after")),
+            per_page_arg(request.args.get("per_page")),
+        )
+        return render_list("staff_list.html", users=page, page=page, roles=ROLES,
+                           role_filter=role_filter, q=q, pager_args={"q": q, "role": role_filter})
 
     @app.route("/staff/new", methods=["GET", "POST"])
     @login_required
@@ -432,6 +533,7 @@ def create_app():
             employee_id = (request.form.get("employee_id") or "").strip()
             email       = (request.form.get("email")       or "").strip()
             role        = (request.form.get("role")        or "Dietary Aide").strip()
+            reset_pw    = (request.form.get("temp_password") or "").strip()
 
             errors = []
             if not username:    errors.append("Username is required.")
@@ -452,7 +554,12 @@ def create_app():
             u.employee_id = employee_id
             u.email       = email
             u.role        = role
+            if reset_pw:
+                u.set_password(reset_pw)
+                u.must_change_password = True
             db.session.commit()
+            if session.get("user", {}).get("id") == u.id:
+                session["user"] = session_user_for(u)
             return redirect(url_for("staff_list"))
 
         values = {
@@ -489,16 +596,20 @@ def create_app():
         query = InventoryItem.query
         if q:
             query = query.filter(InventoryItem.name.ilike(f"%{q}%"))
-        rows = query.order_by(InventoryItem.name).all()
-        items = []
-        for obj in rows:
-            qty = obj.quantity or 0.0
-            low = obj.low_stock_threshold or 0.0
-            is_low = (qty <= low) if (obj.low_stock_threshold is not None) else False
-            items.append({"obj": obj, "is_low": is_low})
         if show == "low":
-            items = [x for x in items if x["is_low"]]
-        return render_template("inventory_list.html", items=items, q=q, show=show)
+            query = query.filter(InventoryItem.is_low)
+
+        def with_flag(obj):
+            return {"obj": obj, "is_low": obj.is_low}
+
+        page = KeysetPage(
+            query, [InventoryItem.name], lambda it: [it.name],
+            decode_cursor(request.args.get("after")),
+            per_page_arg(request.args.get("per_page")),
+            transform=with_flag,
+        )
+        return render_list("inventory_list.html", items=page, page=page, q=q, show=show,
+                           pager_args={"q": q, "show": show})
 
     @app.route("/inventory/new", methods=["GET", "POST"])
     @login_required
@@ -524,6 +635,8 @@ def create_app():
 
             it = InventoryItem(name=name, unit=unit, quantity=qty, low_stock_threshold=low)
             db.session.add(it)
+            db.session.flush()
+            ledger.open_item(it, user_id=current_user_id())
             db.session.commit()
             return redirect(url_for("inventory_list"))
 
@@ -540,7 +653,7 @@ def create_app():
             qty  = _to_float(request.form.get("quantity"), 0.0)
 
             if limited:
-                it.quantity = qty
+                ledger.set_quantity(it, qty, "edit", user_id=current_user_id())
                 db.session.commit()
                 flash("Quantity updated.", "success")
                 return redirect(url_for("inventory_list"))
@@ -562,24 +675,149 @@ def create_app():
 
             if errors:
                 return render_template("inventory_form.html", mode="edit", values=request.form,
-                                       item_id=it.id, units=INVENTORY_UNITS, errors=errors, limited=limited)
-
-            it.name, it.unit, it.quantity, it.low_stock_threshold = name, unit, qty, low
+                                       item_id=it.id, units=INVENTORY_UNITS, errors=errors, limited=limited,
+                                       pack_sizes=it.pack_sizes, all_units=unit_table.units)
+
+            # Cached menu pages show item names and units (and allergy conflicts
+            # matched on names); stock levels alone don't appear on them.
+            relabeled = (it.name, it.unit) != (name, unit)
+            it.name, it.unit, it.low_stock_threshold = name, unit, low
+            ledger.set_quantity(it, qty, "edit", user_id=current_user_id())
             db.session.commit()
+            if relabeled:
+                page_cache.invalidate()
             return redirect(url_for("inventory_list"))
 
         return render_template("inventory_form.html", mode="edit", values=it, item_id=it.id,
-                               units=INVENTORY_UNITS, limited=limited)
+                               units=INVENTORY_UNITS, limited=limited,
+                               pack_sizes=it.pack_sizes, all_units=unit_table.units)
+
+    @app.route("/inventory/<int:iid>/packs", methods=["POST"])
+    @login_required
+    @roles_required("Manager", "Cook")
+    def inventory_pack_add(iid):
+        it = InventoryItem.query.get_or_404(iid)
+        unit = units.normalize(request.form.get("unit"))
+        per_unit = units.normalize(request.form.get("per_unit"))
+        qty = _to_float(request.form.get("quantity"), 0.0)
+        if not unit or not per_unit or unit == per_unit:
+            flash("Choose two different units.", "error")
+        elif not qty > 0:
+            flash("The pack size must be more than zero.", "error")
+        else:
+            db.session.add(PackSize(inventory_id=it.id, unit=unit, quantity=qty, per_unit=per_unit))
+            db.session.commit()
+            flash(f"Pack size added: 1 {unit} = {qty:g} {per_unit}.", "success")
+        return redirect(url_for("inventory_edit", iid=it.id))
+
+    @app.route("/inventory/<int:iid>/packs/<int:pid>/delete", methods=["POST"])
+    @login_required
+    @roles_required("Manager", "Cook")
+    def inventory_pack_delete(iid, pid):
+        p = PackSize.query.filter_by(id=pid, inventory_id=iid).first_or_404()
+        db.session.delete(p)
+        db.session.commit()
+        return redirect(url_for("inventory_edit", iid=iid))
 
     @app.route("/inventory/<int:iid>/delete", methods=["POST"])
     @login_required
     @roles_required("Manager", "Cook")
     def inventory_delete(iid):
         it = InventoryItem.query.get_or_404(iid)
+        ledger.close_item(it, user_id=current_user_id())
         db.session.delete(it)
         db.session.commit()
+        page_cache.invalidate()
         return redirect(url_for("inventory_list"))
 
+    @app.route("/inventory/intake", methods=["GET", "POST"])
+    @login_required
+    @roles_required("Manager", "Cook")
+    def inventory_intake():
+        """
+        Receive a delivery: CSV/JSON manifest (upload, pasted text, or a JSON
+        request body) -> stock added in one batch + a per-line report.
+        JSON requests get the report back as JSON; ?dry_run=1 only validates.
+        """
+        if request.method == "GET":
+            return render_template("inventory_intake.html", units=INVENTORY_UNITS, report=None)
+
+        wants_json = request.is_json
+        dry_run = (request.values.get("dry_run") or "") in ("1", "true", "on")
+        upload = request.files.get("manifest")
+        try:
+            if wants_json:
+                lines = intake.parse_manifest(request.get_data(), "json")
+            elif upload and upload.filename:
+                fmt = "json" if upload.filename.lower().endswith(".json") else None
+                lines = intake.parse_manifest(upload.read(), fmt)
+            else:
+                lines = intake.parse_manifest(request.form.get("manifest_text") or "")
+        except intake.ManifestError as e:
+            if wants_json:
+                return jsonify({"error": str(e)}), 400
+            flash(str(e), "error")
+            return render_template("inventory_intake.html", units=INVENTORY_UNITS, report=None,
+                                   manifest_text=request.form.get("manifest_text") or "")
+
+        report = intake.receive(lines, INVENTORY_UNITS, dry_run=dry_run, user_id=current_user_id())
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+            if report["ok"]:
+                page_cache.invalidate()
+        if wants_json:
+            return jsonify(report)
+        return render_template("inventory_intake.html", units=INVENTORY_UNITS, report=report,
+                               manifest_text=request.form.get("manifest_text") or "")
+
+    @app.route("/inventory/<int:iid>/history")
+    @login_required
+    @roles_required("Manager", "Cook")
+    def inventory_history(iid):
+        """Ledger entries for one item (newest first) + balance as of a chosen date."""
+        it = InventoryItem.query.get_or_404(iid)
+        before = request.args.get("before", type=int)
+        txns = ledger.history(iid, limit=100, before_id=before)
+        users = dict(db.session.query(User.id, User.username)
+                     .filter(User.id.in_({t.user_id for t in txns if t.user_id})))
+
+        as_of, balance = (request.args.get("as_of") or "").strip(), None
+        if as_of:
+            try:
+                when = datetime.strptime(as_of, "%Y-%m-%d") + timedelta(days=1)
+                balance = ledger.balance_as_of(iid, when)
+            except ValueError:
+                flash("Use YYYY-MM-DD for the date.", "error")
+                as_of = ""
+
+        return render_template("inventory_history.html", item=it, txns=txns, users=users,
+                               as_of=as_of, balance=balance,
+                               next_before=txns[-1].id if len(txns) == 100 else None)
+
+    @app.route("/inventory/forecast")
+    @login_required
+    @roles_required("Manager", "Cook", "Dietitian")
+    def inventory_forecast():
+        """Items projected to go low / run out within the horizon (?days=, ?all=1 for every item)."""
+        horizon = forecast.horizon_arg(request.args.get("days"))
+        show_all = request.args.get("all") == "1"
+        rows = forecast.forecast_rows(forecast.stockout_forecast(horizon),
+                                      only_at_risk=not show_all, horizon=horizon)
+        return render_template("inventory_forecast.html", rows=rows, horizon=horizon,
+                               show_all=show_all, today=date.today())
+
+    @app.route("/api/inventory/forecast")
+    @login_required
+    @roles_required("Manager", "Cook", "Dietitian")
+    def api_inventory_forecast():
+        """JSON forecast for every item (?days=, ?at_risk=1 to drop items that stay stocked)."""
+        horizon = forecast.horizon_arg(request.args.get("days"))
+        rows = forecast.forecast_rows(forecast.stockout_forecast(horizon),
+                                      only_at_risk=request.args.get("at_risk") == "1", horizon=horizon)
+        return jsonify({"as_of": date.today().isoformat(), "horizon_days": horizon, "items": rows})
+
     @app.route("/inventory/export")
     @app.route("/inventory/export.csv")
     @login_required
@@ -593,36 +831,8 @@ def create_app():
         q = (request.args.get("q") or "").strip()
         status = (request.args.get("status") or "all").lower()
 
-        qry = InventoryItem.query
-
-        if q:
-            qry = qry.filter(InventoryItem.name.ilike(f"%{q}%"))
-
-        if status == "low":
-            qry = qry.filter(
-                func.coalesce(InventoryItem.quantity, 0) <= func.coalesce(InventoryItem.low_stock_threshold, 0)
-            )
-        elif status == "ok":
-            qry = qry.filter(
-                func.coalesce(InventoryItem.quantity, 0) > func.coalesce(InventoryItem.low_stock_threshold, 0)
-            )
-
-        items = qry.order_by(InventoryItem.name.asc()).all()
-
-        out = io.StringIO()
-        w = csv.writer(out)
-        w.writerow(["Item", "Unit", "Quantity", "Low Stock Threshold", "Status"])
-
-        for it in items:
-            qty = float(it.quantity or 0)
-            thr = float(it.low_stock_threshold or 0)
-            status_label = "LOW" if qty <= thr else "OK"
-            w.writerow([it.name, it.unit, qty, thr, status_label])
-
-        mem = io.BytesIO(out.getvalue().encode("utf-8-sig"))
-        mem.seek(0)
         filename = f"inventory_{status or 'all'}.csv"
-        return send_file(mem, mimetype="text/csv", as_attachment=True, download_name=filename)
+        return csv_response(filename, INVENTORY_HEADER, inventory_rows(q, status))
     
     @app.route("/inventory/<int:iid>/bump", methods=["POST"])
     @login_required
@@ -630,15 +840,45 @@ def create_app():
     def inventory_bump(iid):
         item = InventoryItem.query.get_or_404(iid)
         # Aide can only adjust quantity; Managers/Cooks also have full edit elsewhere
-        try:
-            delta = float(request.form.get("delta", "0"))
-        except Exception:
-            delta = 0.0
-        item.quantity = (item.quantity or 0.0) + delta
-        db.session.commit()
+        delta = _to_float(request.form.get("delta", "0"), None)
+        if delta is None:
+            flash("The adjustment must be a number.", "error")
+        else:
+            ledger.record(item.id, delta, "bump", user_id=current_user_id())
+            db.session.commit()
         # stay on same listing with prior filters if present
         return redirect(url_for("inventory_list", q=request.args.get("q", ""), show=request.args.get("show", "all")))
 
+    @app.route("/api/inventory/<int:iid>/bump", methods=["POST"])
+    @login_required
+    @roles_required("Manager", "Cook", "Dietary Aide")
+    def api_inventory_bump(iid):
+        """
+        JSON bump used by the inventory list. The delta is applied in SQL
+        (quantity = quantity + :delta), so simultaneous taps never lose an
+        update; the list batches rapid taps into one call. Body: {"delta": n}.
+        """
+        data = request.get_json(silent=True) or request.form
+        try:
+            delta = float(data.get("delta", 0))
+        except (TypeError, ValueError):
+            delta = float("nan")
+        if not math.isfinite(delta):
+            return jsonify({"error": "delta must be a number"}), 400
+
+        if delta:
+            row = ledger.record(iid, delta, "bump", user_id=current_user_id())
+        else:
+            row = (db.session.query(InventoryItem.quantity, InventoryItem.low_stock_threshold)
+                   .filter(InventoryItem.id == iid).first())
+        if row is None:
+            db.session.rollback()
+            return jsonify({"error": "Item not found"}), 404
+        db.session.commit()
+
+        qty, threshold = row
+        return jsonify({"id": iid, "quantity": float(qty or 0.0), "low": is_low_stock(qty, threshold)})
+
 
     # ======================================================================
     # Legacy One-Day Menu page  → now served at /menu/legacy
@@ -726,6 +966,7 @@ def create_app():
                         )
                     )
             db.session.commit()
+            page_cache.invalidate(day)
             flash("Menu saved.", "success")
             return redirect(url_for("menu_legacy", day=day.strftime("%Y-%m-%d")))
 
@@ -756,9 +997,41 @@ def create_app():
     @app.route("/menu")
     @login_required
     def menu_hub():
-        return render_template("menu_hub.html")
+        return page_cache.respond("menu_hub", None, None, current_role(),
+                                  lambda: render_template("menu_hub.html"))
 
     # ---- Builder ----------------------------------------------------------
+    def builder_ingredients(inventory_items):
+        """
+        Ingredient rows posted by the builder -> ([MenuIngredient], errors).
+        A row's unit is kept only when it differs from the item's stock unit,
+        and must be convertible to it (standard units or the item's pack sizes).
+        """
+        by_id = {it.id: it for it in inventory_items}
+        ids = request.form.getlist("ingredient_id")
+        qtys = request.form.getlist("quantity")
+        ing_units = request.form.getlist("unit")
+        out, errors = [], []
+        for k, (inv_id, qty) in enumerate(zip(ids, qtys)):
+            if not inv_id or not qty:
+                continue
+            inv = by_id.get(int(inv_id))
+            if not inv:
+                continue
+            unit = units.normalize(ing_units[k] if k < len(ing_units) else "")
+            if unit == units.normalize(inv.unit):
+                unit = None
+            elif unit and unit_table.factor(unit, inv.unit, inv.id) is None:
+                errors.append(f"{inv.name}: can't convert {unit} to {inv.unit}. "
+                              f"Add a pack size for it in Inventory first.")
+                continue
+            out.append(MenuIngredient(inventory_id=inv.id, quantity=_to_float(qty, 0.0), unit=unit or None))
+        return out, errors
+
+    def builder_unit_choices(inventory_items):
+        # {item id: units its quantities can be entered in}, stock unit first
+        return {it.id: unit_table.choices(it.unit, it.id) for it in inventory_items}
+
     @app.route("/menu/builder", methods=["GET", "POST"])
     @login_required
     @roles_required("Manager", "Dietitian")
@@ -771,7 +1044,6 @@ def create_app():
             title       = (request.form.get("title") or "").strip()
             description = (request.form.get("description") or "").strip()
             ids  = request.form.getlist("ingredient_id")
-            qtys = request.form.getlist("quantity")
 
             if meal_type not in ("Breakfast", "Lunch", "Dinner"):
                 errors.append("Select a valid meal type.")
@@ -779,6 +1051,8 @@ def create_app():
                 errors.append("Menu title is required.")
             if not ids:
                 errors.append("Add at least one ingredient.")
+            ingredients, unit_errors = builder_ingredients(inventory_items)
+            errors += unit_errors
 
             if errors:
                 menus = Menu.query.order_by(Menu.meal_type.asc(), Menu.title.asc()).all()
@@ -786,7 +1060,9 @@ def create_app():
                 return render_template(
                     "menu_builder.html",
                     inventory_items=inventory_items,
+                    unit_choices=builder_unit_choices(inventory_items),
                     menus=menus,
+                    conflicts=allergen_idx.conflicts_for(m.id for m in menus),
                     errors=errors,
                     values=values,
                     editing=False,
@@ -795,15 +1071,7 @@ def create_app():
             m = Menu(meal_type=meal_type, title=title, description=description)
             db.session.add(m)
             db.session.flush()
-
-            for inv_id, qty in zip(ids, qtys):
-                if not inv_id or not qty:
-                    continue
-                inv = InventoryItem.query.get(int(inv_id))
-                if not inv:
-                    continue
-                q = _to_float(qty, 0.0)
-                m.ingredients.append(MenuIngredient(inventory_id=inv.id, quantity=q))
+            m.ingredients.extend(ingredients)
 
             db.session.commit()
             flash(f'Menu "{m.title}" added.', "success")
@@ -813,7 +1081,9 @@ def create_app():
         return render_template(
             "menu_builder.html",
             inventory_items=inventory_items,
+            unit_choices=builder_unit_choices(inventory_items),
             menus=menus,
+            conflicts=allergen_idx.conflicts_for(m.id for m in menus),
             errors=errors,
             values=values,
             editing=False,
@@ -837,8 +1107,8 @@ def create_app():
             if not title:
                 errors.append("Menu title is required.")
 
-            ids  = request.form.getlist("ingredient_id")
-            qtys = request.form.getlist("quantity")
+            ingredients, unit_errors = builder_ingredients(inventory_items)
+            errors += unit_errors
 
             if not errors:
                 m.meal_type = meal_type
@@ -846,16 +1116,10 @@ def create_app():
                 m.description = descr
 
                 m.ingredients.clear()
-                for inv_id, qty in zip(ids, qtys):
-                    if not inv_id or not qty:
-                        continue
-                    inv = InventoryItem.query.get(int(inv_id))
-                    if not inv:
-                        continue
-                    q = _to_float(qty, 0.0)
-                    m.ingredients.append(MenuIngredient(inventory_id=inv.id, quantity=q))
+                m.ingredients.extend(ingredients)
 
                 db.session.commit()
+                page_cache.invalidate()  # the menu may be scheduled on any day
                 flash(f'Menu "{m.title}" updated.', "success")
                 return redirect(url_for("menu_builder"))
 
@@ -864,7 +1128,9 @@ def create_app():
         return render_template(
             "menu_builder.html",
             inventory_items=inventory_items,
+            unit_choices=builder_unit_choices(inventory_items),
             menus=[],
+            conflicts={m.id: allergen_idx.conflicts(m.id)},
             errors=errors,
             values=values,
             editing=True,
@@ -879,6 +1145,7 @@ def create_app():
         title = m.title
         db.session.delete(m)
         db.session.commit()
+        page_cache.invalidate()
         flash(f'Menu "{title}" deleted.', "success")
         return redirect(url_for("menu_builder"))
 
@@ -886,96 +1153,91 @@ def create_app():
     @login_required
     def api_menu_items(menu_id):
         """Return a menu's items for dynamic fill in the scheduler."""
-        m = Menu.query.get_or_404(menu_id)
+        m = Menu.query.options(
+            selectinload(Menu.ingredients).joinedload(MenuIngredient.inventory_item)
+        ).get_or_404(menu_id)
         items = []
         for ing in m.ingredients:
-            inv = InventoryItem.query.get(ing.inventory_id)
+            inv = ing.inventory_item
             items.append({
                 "id": ing.id,
                 "inventory_id": ing.inventory_id,
                 "name": inv.name if inv else "",
                 "quantity": ing.quantity,
-                "unit": (inv.unit if inv else "")
+                # overrides typed in the scheduler are in this unit; converted on save
+                "unit": ing.unit or (inv.unit if inv else "")
             })
-        return jsonify({"menu_id": m.id, "meal_type": m.meal_type, "title": m.title, "items": items})
+        return jsonify({"menu_id": m.id, "meal_type": m.meal_type, "title": m.title, "items": items,
+                        "conflicts": allergen_idx.conflicts(m.id)})
 
     # ---- Scheduler --------------------------------------------------------
     @app.route("/menu/scheduler", methods=["GET", "POST"])
     @login_required
     @roles_required("Manager", "Cook", "Dietitian")
     def menu_scheduler():
-        menus = Menu.query.order_by(Menu.meal_type, Menu.title).all()
-        inventory_items = InventoryItem.query.order_by(InventoryItem.name).all()
-
         if request.method == "POST":
             selected_date = _parse_date(request.form.get("date")) or date.today()
             notes = (request.form.get("notes") or "").strip()
 
             # Collect chosen menus and per-ingredient overrides
-            chosen = {}
+            chosen, invalid = {}, []
             for meal_type in ["Breakfast", "Lunch", "Dinner"]:
                 mid = request.form.get(f"{meal_type}_menu")
                 if mid:
-                    chosen[meal_type] = int(mid)
+                    chosen[meal_type] = _to_int(mid)
+                    if chosen[meal_type] is None:
+                        invalid.append(meal_type)
+
+            if invalid:
+                flash("Not saved. Invalid menu selected for " + ", ".join(invalid) + ".", "error")
+                return redirect(url_for("menu_scheduler"))
 
             if not chosen:
                 flash("No menus selected; nothing saved.", "error")
                 return redirect(url_for("menu_scheduler"))
 
-            # 1) Pre-check: aggregate by inventory_id across all meals
-            need_map = {}
-            name_map = {}
-            for meal_type, mid in chosen.items():
-                base_menu = Menu.query.get(mid)
-                for ing in base_menu.ingredients:
-                    override_key = f"{meal_type}_qty_{ing.id}"
-                    use_qty = _to_float(request.form.get(override_key), ing.quantity)
-                    inv = InventoryItem.query.get(ing.inventory_id)
-                    if not inv:
-                        flash(f"Inventory item missing for a menu ingredient in {meal_type}.", "error")
-                        return redirect(url_for("menu_scheduler"))
-                    need_map[inv.id] = need_map.get(inv.id, 0.0) + (use_qty or 0.0)
-                    name_map[inv.id] = (inv.name, inv.unit)
-
-            insuff = []
-            for inv_id, need in need_map.items():
-                inv = InventoryItem.query.get(inv_id)
-                have = inv.quantity or 0.0
-                if have < need:
-                    nm, un = name_map[inv_id]
-                    insuff.append(f"{nm} needs {need:g}{un} (have {have:g})")
-
-            if insuff:
-                flash("Not saved. Issues: " + "; ".join(insuff), "error")
+            # 1) Pre-check: aggregate by inventory_id across all meals; stock
+            #    held by slots being re-saved is freed
+            held = held_usage((selected_date, meal_type) for meal_type in chosen)
+            plan = plan_requirements(
+                chosen,
+                units=unit_table,
+                qty_for=lambda meal_type, ing: _to_float(
+                    request.form.get(f"{meal_type}_qty_{ing.id}"), ing.quantity
+                ),
+                held=held,
+            )
+            if plan["errors"]:
+                flash("Not saved. Issues: " + "; ".join(plan["errors"]), "error")
                 return redirect(url_for("menu_scheduler"))
 
-            # 2) Replace any existing schedule (same date + meal)
+            # 2) Upsert the day's slots (same date + meal replaces in place), then deduct
+            sched_ids = save_schedules(
+                (selected_date, meal_type, mid, notes, plan["lines"][meal_type])
+                for meal_type, mid in chosen.items()
+            )
             deductions = []
-            for meal_type, mid in chosen.items():
-                MenuSchedule.query.filter_by(date=selected_date, meal_type=meal_type).delete(synchronize_session=False)
-
-                sched = MenuSchedule(date=selected_date, meal_type=meal_type, menu_id=mid, notes=notes)
-                db.session.add(sched)
-                db.session.flush()
-
-                base_menu = Menu.query.get(mid)
-                for ing in base_menu.ingredients:
-                    override_key = f"{meal_type}_qty_{ing.id}"
-                    use_qty = _to_float(request.form.get(override_key), ing.quantity)
-                    db.session.add(MenuScheduleItem(
-                        schedule_id=sched.id,
-                        inventory_id=ing.inventory_id,
-                        quantity_used=use_qty
-                    ))
-                    inv = InventoryItem.query.get(ing.inventory_id)
-                    inv.quantity = (inv.quantity or 0.0) - (use_qty or 0.0)
+            for meal_type in chosen:
+                for inv_id, use_qty in plan["lines"][meal_type]:
+                    inv = plan["items"][inv_id]
                     deductions.append(f"{inv.name} -{use_qty:g} {inv.unit}")
 
+            if not apply_deductions(plan["need"]):
+                db.session.rollback()
+                flash("Not saved. Inventory changed while saving; please try again.", "error")
+                return redirect(url_for("menu_scheduler"))
+            day_lines = {(selected_date, meal_type): rows for meal_type, rows in plan["lines"].items()}
+            ledger.append_many(ledger_rows(sched_ids, day_lines, held, plan["items"]),
+                               user_id=current_user_id())
+
             db.session.commit()
+            page_cache.invalidate(selected_date)
             flash("Deducted: " + ", ".join(deductions[:8]) + (" ..." if len(deductions) > 8 else ""), "success")
             return redirect(url_for("menu_scheduler"))
 
         # GET
+        menus = Menu.query.order_by(Menu.meal_type, Menu.title).all()
+        inventory_items = InventoryItem.query.order_by(InventoryItem.name).all()
         day_str = request.args.get("date")
         selected_date = _parse_date(day_str) or date.today()
         existing = MenuSchedule.query.filter_by(date=selected_date).order_by(MenuSchedule.meal_type).all()
@@ -993,6 +1255,94 @@ def create_app():
             suppress_global_flash=True
         )
 
+    # ---- Batch scheduler (date range) -------------------------------------
+    BATCH_MAX_DAYS = 92
+
+    @app.route("/menu/scheduler/batch", methods=["GET", "POST"])
+    @login_required
+    @roles_required("Manager", "Cook", "Dietitian")
+    def menu_scheduler_batch():
+        """Assign menus to every meal across a date range and save it all at once."""
+        src = request.form if request.method == "POST" else request.args
+        start = _parse_date(src.get("start")) or date.today()
+        end = _parse_date(src.get("end")) or (start + timedelta(days=6))
+        if end < start:
+            start, end = end, start
+        if (end - start).days >= BATCH_MAX_DAYS:
+            end = start + timedelta(days=BATCH_MAX_DAYS - 1)
+            flash(f"Range limited to {BATCH_MAX_DAYS} days.", "info")
+        days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+        meals = ["Breakfast", "Lunch", "Dinner"]
+
+        if request.method == "POST":
+            notes = (request.form.get("notes") or "").strip()
+            chosen, invalid = {}, []
+            for d in days:
+                for meal_type in meals:
+                    mid = request.form.get(f"{d:%Y-%m-%d}_{meal_type}_menu")
+                    if mid:
+                        chosen[(d, meal_type)] = _to_int(mid)
+                        if chosen[(d, meal_type)] is None:
+                            invalid.append(f"{d:%Y-%m-%d} {meal_type}")
+
+            if invalid:
+                flash("Not saved. Invalid menu selected for " + "; ".join(invalid[:8])
+                      + (" ..." if len(invalid) > 8 else "") + ".", "error")
+                return redirect(url_for("menu_scheduler_batch", start=start, end=end))
+
+            if not chosen:
+                flash("No menus selected; nothing saved.", "error")
+                return redirect(url_for("menu_scheduler_batch", start=start, end=end))
+
+            # Horizon-wide demand in one pass; every shortfall reported together
+            held = held_usage(chosen)
+            plan = plan_requirements(chosen, units=unit_table, held=held)
+            if plan["errors"]:
+                flash("Not saved. Issues: " + "; ".join(plan["errors"]), "error")
+                return redirect(url_for("menu_scheduler_batch", start=start, end=end))
+
+            sched_ids = save_schedules(
+                (d, meal_type, mid, notes, plan["lines"][(d, meal_type)])
+                for (d, meal_type), mid in chosen.items()
+            )
+            if not apply_deductions(plan["need"]):
+                db.session.rollback()
+                flash("Not saved. Inventory changed while saving; please try again.", "error")
+                return redirect(url_for("menu_scheduler_batch", start=start, end=end))
+            ledger.append_many(ledger_rows(sched_ids, plan["lines"], held, plan["items"]),
+                               user_id=current_user_id())
+
+            db.session.commit()
+            page_cache.invalidate(min(d for d, _ in chosen), max(d for d, _ in chosen))
+            flash(f"Scheduled {len(chosen)} meals across {len({d for d, _ in chosen})} days; "
+                  f"deducted {sum(q > 0 for q in plan['need'].values())} inventory items.", "success")
+            return redirect(url_for("planned_menus"))
+
+        menus = Menu.query.order_by(Menu.meal_type, Menu.title).all()
+        by_meal = {m: [] for m in meals}
+        for m in menus:
+            by_meal.get(m.meal_type, []).append(m)
+
+        # Already-planned slots are shown for reference, not preselected, so a
+        # re-submit doesn't deduct the same meal twice.
+        existing = {}
+        for s in (MenuSchedule.query
+                  .options(joinedload(MenuSchedule.menu))
+                  .filter(MenuSchedule.date >= start, MenuSchedule.date <= end)
+                  .all()):
+            existing[(s.date, s.meal_type)] = s.menu.title if s.menu else "(untitled)"
+
+        return render_template(
+            "menu_scheduler_batch.html",
+            start=start,
+            end=end,
+            days=days,
+            meals=meals,
+            menus_by_meal=by_meal,
+            existing=existing,
+            max_days=BATCH_MAX_DAYS,
+        )
+
     # ----- Planned Menus (weekly viewer) --------------------------------------
     @app.route("/menu/planned")
     @login_required
@@ -1007,41 +1357,51 @@ def create_app():
         current_monday = today - timedelta(days=today.weekday())
         week_start = current_monday + timedelta(weeks=offset)
         week_end = week_start + timedelta(days=6)
+        return page_cache.respond("planned_menus", week_start, week_end, current_role(),
+                                  lambda: render_planned_week(offset, week_start, week_end),
+                                  extra=str(offset))
 
+    def render_planned_week(offset, week_start, week_end):
         # FIX: days need {'dow','date'} (template expects d.dow and d.date)
         dows = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
         days = [{"dow": dows[i], "date": (week_start + timedelta(days=i))} for i in range(7)]
 
-        schedules = (
-            MenuSchedule.query
-            .filter(MenuSchedule.date >= week_start,
-                    MenuSchedule.date <= week_end)
-            .order_by(MenuSchedule.date.asc(), MenuSchedule.meal_type.asc())
-            .all()
-        )
+        # The whole grid in one joined query; its rows (plus allergy counts)
+        # are also the week's version stamp, so a tablet re-polling an
+        # unchanged week gets a 304 without the page being rendered.
+        rows = (db.session.query(MenuSchedule.id, MenuSchedule.date, MenuSchedule.meal_type,
+                                 MenuSchedule.menu_id, Menu.title)
+                .outerjoin(Menu, Menu.id == MenuSchedule.menu_id)
+                .filter(MenuSchedule.date >= week_start,
+                        MenuSchedule.date <= week_end)
+                .order_by(MenuSchedule.date.asc(), MenuSchedule.meal_type.asc(), MenuSchedule.id.asc())
+                .all())
+        conflicts = {mid: len(c) for mid, c in allergen_idx.conflicts_for(r.menu_id for r in rows).items()}
+
+        etag = hashlib.sha1(repr((
+            current_role(), str(week_start),
+            [tuple(r) for r in rows], sorted(conflicts.items()),
+        )).encode("utf-8")).hexdigest()
+        # Pending flashes must still be shown (and popped) by a real render.
+        if request.if_none_match.contains(etag) and not session.get("_flashes"):
+            resp = app.response_class(status=304)
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "private, no-cache"
+            return resp
 
         # grouped: { date: { meal_type: [ {id, menu_title} ] } }
         grouped = defaultdict(lambda: defaultdict(list))
-        # preload titles to minimize queries
-        menu_title_cache = {}
-        def menu_title(mid):
-            if mid in menu_title_cache:
-                return menu_title_cache[mid]
-            m = Menu.query.get(mid) if mid else None
-            title = m.title if m else "(untitled)"
-            menu_title_cache[mid] = title
-            return title
-
-        for s in schedules:
-            grouped[s.date][s.meal_type].append({
-                "id": s.id,
-                "menu_title": menu_title(s.menu_id)
+        for r in rows:
+            grouped[r.date][r.meal_type].append({
+                "id": r.id,
+                "menu_title": r.title or "(untitled)",
+                "conflicts": conflicts.get(r.menu_id, 0),
             })
 
         prev_url = url_for("planned_menus", offset=offset-1)
         next_url = url_for("planned_menus", offset=offset+1)
 
-        return render_template(
+        resp = app.make_response(render_template(
             "planned_menu_week.html",
             grouped=grouped,
             week_start=week_start,
@@ -1050,15 +1410,33 @@ def create_app():
             prev_url=prev_url,
             next_url=next_url,
             offset=offset
-        )
+        ))
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    @app.route("/menu/planned/export.csv")
+    @login_required
+    def planned_menus_export():
+        """
+        Export scheduled menus and the inventory they used as CSV (streamed).
+        Supported query params: start, end (any date format _parse_date accepts).
+        """
+        start = _parse_date(request.args.get("start"))
+        end = _parse_date(request.args.get("end"))
+        label = f"{start or 'all'}_{end or 'all'}"
+        return csv_response(f"menu_schedule_{label}.csv", SCHEDULE_HEADER, schedule_rows(start, end))
 
     @app.route("/menu/plan/<int:schedule_id>/delete")
     @login_required
+    @replica.use_primary
     def delete_schedule(schedule_id):
         nxt = request.args.get("next") or url_for("planned_menus")
         s = MenuSchedule.query.get_or_404(schedule_id)
+        day = s.date
         db.session.delete(s)
         db.session.commit()
+        page_cache.invalidate(day)
         flash("Scheduled menu removed.", "success")
         return redirect(nxt)
 
@@ -1069,8 +1447,19 @@ def create_app():
         if not d:
             flash("Invalid date.", "error")
             return redirect(url_for("planned_menus"))
+        return page_cache.respond("planned_menu_view", d, d, current_role(),
+                                  lambda: render_planned_day(d))
 
+    def render_planned_day(d):
+        # Whole day in two round trips: schedules + menu (joined), then
+        # every item row with its inventory item (selectin), however many
+        # ingredients each meal has.
         schedules = (MenuSchedule.query
+                    .options(
+                        joinedload(MenuSchedule.menu),
+                        selectinload(MenuSchedule.items)
+                        .joinedload(MenuScheduleItem.inventory_item),
+                    )
                     .filter_by(date=d)
                     .order_by(MenuSchedule.meal_type.asc())
                     .all())
@@ -1080,30 +1469,21 @@ def create_app():
 
         detail = []
         for s in schedules:
-            rows = (MenuScheduleItem.query
-                    .filter_by(schedule_id=s.id)
-                    .order_by(MenuScheduleItem.id.asc())
-                    .all())
             items = []
-            for r in rows:
-                inv = InventoryItem.query.get(r.inventory_id)
+            for r in s.items:
+                inv = r.inventory_item
                 items.append({
                     "name": inv.name if inv else "(deleted item)",
                     "unit": inv.unit if inv else "",
                     "qty":  r.quantity_used or 0.0
                 })
 
-            title = "(untitled)"
-            if getattr(s, "menu_id", None):
-                mm = Menu.query.get(s.menu_id)
-                if mm:
-                    title = mm.title
-
             detail.append({
                 "meal": s.meal_type,
                 "notes": getattr(s, "notes", None),
-                "menu_title": title,
+                "menu_title": s.menu.title if s.menu else "(untitled)",
                 "items": items,
+                "conflicts": allergen_idx.conflicts(s.menu_id),
             })
 
         return render_template("planned_menu_view.html", day_value=d, blocks=detail)
@@ -1112,10 +1492,13 @@ def create_app():
     @app.route("/menu/daily")
     @login_required
     def menu_daily():
-        from models import MenuEntry
         start = _parse_date(request.args.get("start"))
         end   = _parse_date(request.args.get("end"))
+        return page_cache.respond("menu_daily", start, end, current_role(),
+                                  lambda: render_menu_daily(start, end))
 
+    def render_menu_daily(start, end):
+        from models import MenuEntry
         q = MenuEntry.query
         if start: q = q.filter(MenuEntry.day >= start)
         if end:   q = q.filter(MenuEntry.day <= end)
@@ -1154,55 +1537,97 @@ def create_app():
             return redirect(url_for("menu_daily"))
         MenuEntry.query.filter_by(day=d).delete()
         db.session.commit()
+        page_cache.invalidate(d)
         flash(f"Deleted daily menu for {d}.", "success")
         return redirect(url_for("menu_daily"))
 
 
 
     
-            # -------------------- Chatbot API Route --------------------
+    # -------------------- Chatbot API Route --------------------
+    chat_backend = chatbot.init_app(app)
+    kitchen_ctx = kitchen_context.init_app(app)
+
+    def _chat_messages(user_message):
+        prompt = chatbot.SYSTEM_PROMPT
+        if app.config["CHATBOT_CONTEXT_ENABLED"]:
+            prompt += ("\n\nCurrent kitchen data (use it to answer questions about residents, "
+                       "stock and today's menu):\n" + kitchen_ctx.text())
+        return chatbot.build_messages(user_message, system_prompt=prompt)
+
+    def _chat_message():
+        data = request.get_json(silent=True) or {}
+        return (data.get("message") or "").strip()
+
+    def _chat_bypass_cache():
+        data = request.get_json(silent=True) or {}
+        return bool(data.get("no_cache")) or request.args.get("nocache") == "1"
+
     @app.route('/api/chatbot', methods=['POST'])
+    @login_required
     def chatbot_api():
-        """Handle chatbot requests using OpenAI API"""
+        """Handle chatbot requests (blocking JSON reply)"""
+        user_message = _chat_message()
+        if not user_message:
+            return jsonify({'error': 'No message provided'}), 400
         try:
-            data = request.get_json()
-            user_message = data.get('message', '')
-            
-            if not user_message:
-                return jsonify({'error': 'No message provided'}), 400
-            
-            # Initialize OpenAI client with API key from environment
-            client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
-            
-            # Create context about the kitchen management system
-            system_prompt = """You are a helpful AI assistant for a kitchen management system. 
-            You can help with:
-            - Information about residents and their dietary requirements
-            - Menu planning and recipe suggestions
-            - Inventory management questions
-            - General kitchen management advice
-            
-            Be concise, friendly, and helpful. Keep responses under 150 words."""
-            
-            # Call OpenAI API
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_message}
-                ],
-                max_tokens=200,
-                temperature=0.7
+            bot_response = chat_backend.complete(
+                _chat_messages(user_message), bypass_cache=_chat_bypass_cache()
             )
-            
-            bot_response = response.choices[0].message.content
-            
             return jsonify({'response': bot_response})
-        
+        except chatbot.ChatBusy:
+            return jsonify({'error': 'The assistant is busy right now. Please try again in a moment.'}), 503
+        except chatbot.ChatTimeout:
+            return jsonify({'error': 'The assistant took too long to answer. Please try again.'}), 504
         except Exception as e:
             app.logger.error(f"Chatbot API error: {str(e)}")
         return jsonify({'error': 'Sorry, I encountered an error. Please try again.'}), 500
 
+    @app.route('/api/chatbot/stream', methods=['POST'])
+    @login_required
+    def chatbot_stream():
+        """Stream the reply as server-sent events: data: {"token": ...} ... event: done"""
+        user_message = _chat_message()
+        if not user_message:
+            return jsonify({'error': 'No message provided'}), 400
+
+        def sse(payload, event=None):
+            head = f"event: {event}\n" if event else ""
+            return f"{head}data: {json.dumps(payload)}\n\n"
+
+        bypass = _chat_bypass_cache()
+        # Built here, inside the app context: the generator runs after the view returns.
+        messages = _chat_messages(user_message)
+
+        def generate():
+            try:
+                for token in chat_backend.stream(messages, bypass_cache=bypass):
+                    yield sse({"token": token})
+                yield sse({}, event="done")
+            except chatbot.ChatBusy:
+                yield sse({"error": "The assistant is busy right now. Please try again in a moment."}, event="error")
+            except chatbot.ChatTimeout:
+                yield sse({"error": "The assistant took too long to answer. Please try again."}, event="error")
+            except Exception as e:
+                app.logger.error(f"Chatbot stream error: {str(e)}")
+                yield sse({"error": "Sorry, I encountered an error. Please try again."}, event="error")
+
+        return app.response_class(
+            generate(), mimetype="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+
+    @app.route('/api/chatbot/cache', methods=['GET', 'DELETE'])
+    @login_required
+    @roles_required("Manager")
+    def chatbot_cache():
+        """Response-cache counters (GET) or flush (DELETE)."""
+        if chat_backend.cache is None:
+            return jsonify({'enabled': False})
+        if request.method == 'DELETE':
+            chat_backend.cache.clear()
+        return jsonify({'enabled': True, **chat_backend.cache.stats()})
+
 
     # ---------------- end of routes ----------------
     return app
@@ -0,0 +1,167 @@
+# bench_db.py — concurrent-writer throughput for each engine profile (dbconfig.py).
+# Each writer is a separate process (like a gunicorn worker) running short
+# scheduler-style transactions: read a few inventory rows, deduct them and
+# append their ledger entries. Readers poll the same table meanwhile. Reports commits/s,
+# latency and how many transactions failed with "database is locked".
+#
+#   python bench_db.py                          # both profiles, temp SQLite files
+#   python bench_db.py --writers 16 --seconds 10
+#   python bench_db.py --url postgresql://...   # a scratch Postgres database
+#   python bench_db.py --json                   # machine-readable output
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from flask import Flask
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import dbconfig
+
+ITEMS = 200
+LINES_PER_TXN = 5
+
+_DDL = [
+    "CREATE TABLE bench_item (id INTEGER PRIMARY KEY, quantity FLOAT NOT NULL)",
+    """CREATE TABLE bench_txn (id INTEGER PRIMARY KEY {auto}, item_id INTEGER NOT NULL,
+                               delta FLOAT NOT NULL, created_at FLOAT NOT NULL)""",
+]
+
+
+def _profile_config(url, profile):
+    app = Flask(__name__)
+    app.config.update(SQLALCHEMY_DATABASE_URI=url, DB_PROFILE=profile)
+    dbconfig.configure(app)
+    return dict(app.config)
+
+
+def _engine(url, config):
+    engine = create_engine(url, **config["SQLALCHEMY_ENGINE_OPTIONS"])
+    dbconfig.install(engine, config)
+    return engine
+
+
+def _setup(url, config):
+    engine = _engine(url, config)
+    auto = "GENERATED BY DEFAULT AS IDENTITY" if engine.dialect.name == "postgresql" else ""
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE IF EXISTS bench_txn"))
+        conn.execute(text("DROP TABLE IF EXISTS bench_item"))
+        for ddl in _DDL:
+            conn.execute(text(ddl.format(auto=auto)))
+        conn.execute(text("INSERT INTO bench_item (id, quantity) VALUES (:id, 1000000)"),
+                     [{"id": i} for i in range(1, ITEMS + 1)])
+    engine.dispose()
+
+
+def _writer(url, config, seconds, out):
+    engine = _engine(url, config)
+    rng = random.Random(os.getpid())
+    done, locked, latencies = 0, 0, []
+    end = time.time() + seconds
+    while time.time() < end:
+        ids = rng.sample(range(1, ITEMS + 1), LINES_PER_TXN)
+        t0 = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                # Read first, then write: the scheduler's pre-check shape
+                conn.execute(text("SELECT id, quantity FROM bench_item WHERE id IN (%s)"
+                                  % ",".join(map(str, ids)))).fetchall()
+                conn.execute(text("UPDATE bench_item SET quantity = quantity - 1 WHERE id = :id"),
+                             [{"id": i} for i in ids])
+                conn.execute(text("INSERT INTO bench_txn (item_id, delta, created_at) VALUES (:id, -1, :t)"),
+                             [{"id": i, "t": time.time()} for i in ids])
+        except OperationalError as e:
+            if "locked" not in str(e).lower() and "busy" not in str(e).lower():
+                raise
+            locked += 1
+            continue
+        latencies.append(time.perf_counter() - t0)
+        done += 1
+    engine.dispose()
+    out.put(("writer", done, locked, latencies))
+
+
+def _reader(url, config, seconds, out):
+    engine = _engine(url, config)
+    done, locked = 0, 0
+    end = time.time() + seconds
+    while time.time() < end:
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT count(*), sum(quantity) FROM bench_item")).fetchone()
+            done += 1
+        except OperationalError:
+            locked += 1
+    engine.dispose()
+    out.put(("reader", done, locked, []))
+
+
+def run(url, profile, writers, readers, seconds):
+    config = _profile_config(url, profile)
+    _setup(url, config)
+    out = mp.Queue()
+    procs = [mp.Process(target=_writer, args=(url, config, seconds, out)) for _ in range(writers)]
+    procs += [mp.Process(target=_reader, args=(url, config, seconds, out)) for _ in range(readers)]
+    for p in procs:
+        p.start()
+    results = [out.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    w = [r for r in results if r[0] == "writer"]
+    rd = [r for r in results if r[0] == "reader"]
+    lat = sorted(x for r in w for x in r[3])
+    commits = sum(r[1] for r in w)
+    return {
+        "profile": profile,
+        "backend": url.split(":", 1)[0],
+        "writers": writers,
+        "readers": readers,
+        "seconds": seconds,
+        "commits": commits,
+        "commits_per_sec": round(commits / seconds, 1),
+        "locked_errors": sum(r[2] for r in w),
+        "reads_per_sec": round(sum(r[1] for r in rd) / seconds, 1),
+        "read_errors": sum(r[2] for r in rd),
+        "p50_ms": round(statistics.median(lat) * 1000, 2) if lat else None,
+        "p95_ms": round(lat[int(len(lat) * 0.95) - 1] * 1000, 2) if lat else None,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Concurrent-writer throughput for each DB_PROFILE.")
+    ap.add_argument("--profile", action="append", choices=dbconfig.PROFILES,
+                    help="Profile to run (repeatable); default: all.")
+    ap.add_argument("--url", help="Database URL; default: a fresh temp SQLite file per profile.")
+    ap.add_argument("--writers", type=int, default=8)
+    ap.add_argument("--readers", type=int, default=2)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = ap.parse_args()
+
+    rows = []
+    for profile in args.profile or dbconfig.PROFILES:
+        url = args.url
+        if not url:
+            url = "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix=f"bench_{profile}_"), "bench.db")
+        rows.append(run(url, profile, args.writers, args.readers, args.seconds))
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    cols = ["profile", "backend", "writers", "commits_per_sec", "locked_errors",
+            "p50_ms", "p95_ms", "reads_per_sec", "read_errors"]
+    print("  ".join(f"{c:>15}" for c in cols))
+    for r in rows:
+        print("  ".join(f"{str(r[c]):>15}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
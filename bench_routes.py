@@ -0,0 +1,270 @@
+# bench_routes.py — route-level benchmark against seeded synthetic data.
+# Boots create_app() on a throwaway SQLite file, seeds residents, inventory,
+# menus and a year of schedule history with `flask seed` (seed.py), then
+# drives the main routes through the Flask test client and reports latency
+# percentiles and SQL statements per request. --save writes the results as a
+# JSON baseline; --compare checks a run against one and exits non-zero on a
+# regression (more queries per request, or p95 beyond the tolerance).
+#
+#   python bench_routes.py                                  # defaults, table output
+#   python bench_routes.py --residents 20000 --requests 100
+#   python bench_routes.py --save bench_baseline.json
+#   python bench_routes.py --compare bench_baseline.json --tolerance 0.25
+#
+# Latency depends on the machine: compare against a baseline saved on the same
+# one. Query counts don't, so they are checked exactly.
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from seed import LAST_NAMES, MEALS
+
+# Added to every item after seeding, so the measured scheduler POSTs never run short
+RESTOCK = 1_000_000.0
+
+
+# -------------------------- setup --------------------------
+def make_app(workdir, page_cache):
+    """create_app() on a fresh SQLite file in `workdir`, tables created."""
+    os.chdir(workdir)   # create_app() makes instance/ in the working directory
+    os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(workdir, "bench.db")
+    os.environ["PAGE_CACHE_PATH"] = os.path.join(workdir, "page_cache.sqlite")
+    os.environ["PAGE_CACHE_ENABLED"] = "1" if page_cache else "0"
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def load_data(app, residents, items, menus, days, seed_value):
+    """Seed through `flask seed` (seed.py); returns what the route drivers need."""
+    import ledger
+    from models import db, User, InventoryItem, Menu
+
+    first_day = date.today() - timedelta(days=days)
+    result = app.test_cli_runner().invoke(args=[
+        "seed", "--residents", str(residents), "--items", str(items), "--menus", str(menus),
+        "--years", str(days / 365.0), "--end", str(date.today() - timedelta(days=1)),
+        "--seed", str(seed_value)])
+    if result.exit_code:
+        raise SystemExit(f"flask seed failed:\n{result.output}")
+
+    with app.app_context():
+        user = User(username="bench", role="Manager", first_name="Bench", last_name="User")
+        user.set_password("bench")
+        db.session.add(user)
+        db.session.execute(sa.update(InventoryItem).values(quantity=InventoryItem.quantity + RESTOCK))
+        ledger.append_many((iid, RESTOCK, "restock", None) for (iid,) in db.session.query(InventoryItem.id))
+        db.session.commit()
+        by_meal = {meal: [] for meal in MEALS}
+        for mid, meal in db.session.query(Menu.id, Menu.meal_type).order_by(Menu.id):
+            by_meal.setdefault(meal, []).append(mid)
+        return {"user_id": user.id, "by_meal": by_meal, "first_day": first_day}
+
+
+# -------------------------- routes --------------------------
+def routes(ctx, rng):
+    """name -> (method, expected status, request(i) -> (path, form or None))."""
+    first_day, by_meal = ctx["first_day"], ctx["by_meal"]
+    history = max(1, (date.today() - first_day).days)
+    scheduled_from = date.today() + timedelta(days=400)
+
+    def scheduler(i):
+        form = {"date": (scheduled_from + timedelta(days=i)).isoformat(), "notes": "bench"}
+        for meal in MEALS:
+            if by_meal[meal]:
+                form[f"{meal}_menu"] = str(rng.choice(by_meal[meal]))
+        return "/menu/scheduler", form
+
+    return {
+        "residents_list": ("GET", 200, lambda i: (f"/residents?q={rng.choice(LAST_NAMES)}", None)),
+        "inventory_list": ("GET", 200, lambda i: ("/inventory", None)),
+        "menu_scheduler": ("POST", 302, scheduler),
+        "planned_menus": ("GET", 200, lambda i: (f"/menu/planned?offset={-rng.randrange(history // 7 + 1)}",
+                                                 None)),
+        "planned_menu_view": ("GET", 200, lambda i: (
+            f"/menu/planned/{first_day + timedelta(days=rng.randrange(history))}", None)),
+        "inventory_export": ("GET", 200, lambda i: ("/inventory/export.csv", None)),
+    }
+
+
+class QueryCounter:
+    """Counts statements on every engine (primary and any replica bind)."""
+
+    def __init__(self, engines):
+        self.engines = list(engines)
+        self.n = 0
+        for e in self.engines:
+            event.listen(e, "before_cursor_execute", self._count)
+
+    def _count(self, *_):
+        self.n += 1
+
+    def close(self):
+        for e in self.engines:
+            event.remove(e, "before_cursor_execute", self._count)
+
+
+def _percentile(sorted_values, p):
+    k = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+def drive(app, ctx, requests, warmup, rng, only=None):
+    from models import db
+
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user"] = {"id": ctx["user_id"], "username": "bench", "role": "Manager",
+                     "first_name": "Bench", "last_name": "User",
+                     "must_change_password": False, "checked_at": int(time.time())}
+    with app.app_context():
+        counter = QueryCounter(db.engines.values())
+
+    results = {}
+    i = 0
+    try:
+        for name, (method, expected, make) in routes(ctx, rng).items():
+            if only and name not in only:
+                continue
+            latencies, queries, errors = [], [], 0
+            for n in range(warmup + requests):
+                path, form = make(i)
+                i += 1
+                counter.n = 0
+                t0 = time.perf_counter()
+                resp = client.open(path, method=method, data=form)
+                resp.get_data()   # drain streamed bodies
+                elapsed = time.perf_counter() - t0
+                with client.session_transaction() as s:
+                    # A POST's flash would otherwise ride along into the next render
+                    flashes = s.pop("_flashes", [])
+                if resp.status_code != expected or any(cat == "error" for cat, _ in flashes):
+                    errors += 1
+                if n >= warmup:
+                    latencies.append(elapsed)
+                    queries.append(counter.n)
+            lat = sorted(latencies)
+            results[name] = {
+                "method": method,
+                "requests": requests,
+                "errors": errors,
+                "p50_ms": round(_percentile(lat, 50) * 1000, 2),
+                "p95_ms": round(_percentile(lat, 95) * 1000, 2),
+                "p99_ms": round(_percentile(lat, 99) * 1000, 2),
+                "mean_ms": round(statistics.mean(lat) * 1000, 2),
+                "queries_mean": round(statistics.mean(queries), 2),
+                "queries_max": max(queries),
+            }
+    finally:
+        counter.close()
+    return results
+
+
+# -------------------------- baseline --------------------------
+def compare(current, baseline, tolerance):
+    """Per-route regression messages (empty list = no regressions)."""
+    problems = []
+    if current["volumes"] != baseline.get("volumes"):
+        print(f"warning: baseline volumes {baseline.get('volumes')} differ from this run's "
+              f"{current['volumes']}", file=sys.stderr)
+    for name, row in current["routes"].items():
+        base = baseline.get("routes", {}).get(name)
+        if not base:
+            continue
+        if row["errors"]:
+            problems.append(f"{name}: {row['errors']} failed requests")
+        if row["queries_max"] > base["queries_max"]:
+            problems.append(f"{name}: queries/request {base['queries_max']} -> {row['queries_max']}")
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            problems.append(f"{name}: p95 {base['p95_ms']}ms -> {row['p95_ms']}ms "
+                            f"(+{(row['p95_ms'] / base['p95_ms'] - 1) * 100:.0f}%)")
+    return problems
+
+
+def print_table(run, baseline=None):
+    cols = ["route", "method", "p50_ms", "p95_ms", "p99_ms", "queries_mean", "queries_max", "errors"]
+    if baseline:
+        cols += ["base_p95_ms", "base_queries"]
+    print("  ".join(f"{c:>17}" for c in cols))
+    for name, row in run["routes"].items():
+        row = dict(row, route=name)
+        base = (baseline or {}).get("routes", {}).get(name, {})
+        row["base_p95_ms"] = base.get("p95_ms", "-")
+        row["base_queries"] = base.get("queries_max", "-")
+        print("  ".join(f"{str(row[c]):>17}" for c in cols))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Route latency and SQL query counts on seeded data.")
+    ap.add_argument("--residents", type=int, default=2000)
+    ap.add_argument("--items", type=int, default=500, help="Inventory items.")
+    ap.add_argument("--menus", type=int, default=60)
+    ap.add_argument("--days", type=int, default=365, help="Days of schedule history before today.")
+    ap.add_argument("--requests", type=int, default=50, help="Measured requests per route.")
+    ap.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per route first.")
+    ap.add_argument("--route", action="append", help="Only this route (repeatable); default: all.")
+    ap.add_argument("--seed", type=int, default=1, help="Random seed for data and request mix.")
+    ap.add_argument("--page-cache", action="store_true",
+                    help="Leave the server-side page cache on (default off, so renders are measured).")
+    ap.add_argument("--save", metavar="PATH", help="Write the results as a JSON baseline.")
+    ap.add_argument("--compare", metavar="PATH", help="Compare against a saved baseline.")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95 slowdown vs baseline.")
+    ap.add_argument("--json", action="store_true", help="Print results as JSON.")
+    args = ap.parse_args()
+
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_routes_")
+    app = make_app(workdir, args.page_cache)
+
+    t0 = time.perf_counter()
+    ctx = load_data(app, args.residents, args.items, args.menus, args.days, args.seed)
+    seeded = time.perf_counter() - t0
+
+    run = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "sqlalchemy": sa.__version__},
+        "volumes": {"residents": args.residents, "items": args.items, "menus": args.menus,
+                    "days": args.days, "seed": args.seed, "page_cache": args.page_cache},
+        "seed_seconds": round(seeded, 2),
+        "routes": drive(app, ctx, args.requests, args.warmup, rng, only=args.route),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    if args.json:
+        print(json.dumps(run, indent=2))
+    else:
+        print_table(run, baseline)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(run, f, indent=2)
+            f.write("\n")
+    if baseline:
+        problems = compare(run, baseline, args.tolerance)
+        for p in problems:
+            print("REGRESSION " + p, file=sys.stderr)
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
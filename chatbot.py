@@ -0,0 +1,284 @@
+# chatbot.py — chatbot backend: pooled provider client, bounded worker pool, streaming.
+# Completions run on a small per-process thread pool with a hard timeout, so a
+# slow upstream can only ever occupy CHATBOT_WORKERS threads; extra requests are
+# refused straight away instead of queueing behind it. Providers are pluggable:
+# "openai" for production, "fake" for offline development and load tests.
+
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from sqlitecache import SQLiteLRU
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+
+SYSTEM_PROMPT = """You are a helpful AI assistant for a kitchen management system.
+            You can help with:
+            - Information about residents and their dietary requirements
+            - Menu planning and recipe suggestions
+            - Inventory management questions
+            - General kitchen management advice
+
+            Be concise, friendly, and helpful. Keep responses under 150 words."""
+
+
+class ChatBusy(Exception):
+    """Every chatbot worker is in use."""
+
+
+class ChatTimeout(Exception):
+    """The provider didn't answer within CHATBOT_TIMEOUT seconds."""
+
+
+# -------------------------- providers --------------------------
+class OpenAIProvider:
+    """OpenAI chat completions through one client shared by the whole process."""
+
+    def __init__(self, api_key=None, model=DEFAULT_MODEL, timeout=30.0):
+        self.api_key = api_key
+        self.model = model
+        self.timeout = timeout
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use (after gunicorn forks) and reused for keep-alive.
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(api_key=self.api_key, timeout=self.timeout, max_retries=1)
+        return self._client
+
+    def complete(self, messages, max_tokens=200, temperature=0.7):
+        resp = self.client.chat.completions.create(
+            model=self.model, messages=messages, max_tokens=max_tokens, temperature=temperature,
+        )
+        return resp.choices[0].message.content or ""
+
+    def stream(self, messages, max_tokens=200, temperature=0.7):
+        chunks = self.client.chat.completions.create(
+            model=self.model, messages=messages, max_tokens=max_tokens,
+            temperature=temperature, stream=True,
+        )
+        for chunk in chunks:
+            if chunk.choices:
+                token = chunk.choices[0].delta.content
+                if token:
+                    yield token
+
+
+class FakeProvider:
+    """Offline provider: echoes the question back word by word after a set delay."""
+
+    def __init__(self, delay=0.02, first_token_delay=0.2):
+        self.delay = delay
+        self.first_token_delay = first_token_delay
+
+    def _reply(self, messages):
+        question = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        return f"(offline assistant) You asked: {question}"
+
+    def complete(self, messages, **_):
+        text = self._reply(messages)
+        time.sleep(self.first_token_delay + self.delay * len(text.split()))
+        return text
+
+    def stream(self, messages, **_):
+        time.sleep(self.first_token_delay)
+        for i, word in enumerate(self._reply(messages).split(" ")):
+            if i:
+                time.sleep(self.delay)
+            yield word if i == 0 else " " + word
+
+
+PROVIDERS = {"openai": OpenAIProvider, "fake": FakeProvider}
+
+
+def provider_from_config(config):
+    name = config["CHATBOT_PROVIDER"]
+    if name == "fake":
+        return FakeProvider(delay=config["CHATBOT_FAKE_DELAY"])
+    if name == "openai":
+        return OpenAIProvider(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            model=config["CHATBOT_MODEL"],
+            timeout=config["CHATBOT_TIMEOUT"],
+        )
+    raise ValueError(f"Unknown CHATBOT_PROVIDER {name!r} (expected one of {sorted(PROVIDERS)})")
+
+
+# -------------------------- response cache --------------------------
+class ResponseCache(SQLiteLRU):
+    """
+    Answers to repeated questions, keyed by the normalized prompt. Lives in a
+    small SQLite file so every gunicorn worker shares the same entries and
+    hit/miss counters.
+    """
+
+    table = "response"
+    columns = (("response", "TEXT NOT NULL"),)
+    meta = "stats"
+
+    def __init__(self, path, ttl=86400, max_entries=1000):
+        super().__init__(path, ttl, max_entries)
+
+    @staticmethod
+    def normalize(text):
+        text = re.sub(r"[^\w\s]", " ", (text or "").lower())
+        return " ".join(text.split())
+
+    def key_for(self, messages, model=""):
+        system = "\n".join(m["content"] for m in messages if m["role"] == "system")
+        user = self.normalize(next((m["content"] for m in reversed(messages) if m["role"] == "user"), ""))
+        raw = "\x1f".join([model, hashlib.sha256(system.encode("utf-8")).hexdigest(), user])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        row = super().get(key)
+        return row[0] if row else None
+
+    def put(self, key, response):
+        super().put(key, (response,))
+
+
+# -------------------------- backend --------------------------
+_DONE = object()
+
+
+class ChatBackend:
+    def __init__(self, provider, workers=4, timeout=30.0, cache=None, model=""):
+        self.provider = provider
+        self.timeout = timeout
+        self.cache = cache
+        self.model = model
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chatbot")
+        self._slots = threading.BoundedSemaphore(workers)
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            raise ChatBusy()
+
+    def _cached(self, messages, bypass):
+        if self.cache is None or bypass:
+            return None, None
+        key = self.cache.key_for(messages, self.model)
+        return key, self.cache.get(key)
+
+    def complete(self, messages, bypass_cache=False, **opts):
+        """Blocking completion, bounded by the pool size and the timeout."""
+        key, hit = self._cached(messages, bypass_cache)
+        if hit is not None:
+            return hit
+        text = self._complete(messages, **opts)
+        if key and text:
+            self.cache.put(key, text)
+        return text
+
+    def _complete(self, messages, **opts):
+        self._acquire()
+        try:
+            fut = self._pool.submit(self.provider.complete, messages, **opts)
+        except Exception:
+            self._slots.release()
+            raise
+        fut.add_done_callback(lambda _: self._slots.release())
+        try:
+            return fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            raise ChatTimeout()
+
+    def stream(self, messages, bypass_cache=False, **opts):
+        """Yield tokens; a cached answer comes back whole as a single token."""
+        key, hit = self._cached(messages, bypass_cache)
+        if hit is not None:
+            yield hit
+            return
+        parts = []
+        for token in self._stream(messages, **opts):
+            parts.append(token)
+            yield token
+        if key and parts:
+            self.cache.put(key, "".join(parts))
+
+    def _stream(self, messages, **opts):
+        """
+        Yield tokens as the provider produces them. The provider runs on a pool
+        thread; this generator only waits on a queue, and tells the worker to
+        stop if the client goes away.
+        """
+        self._acquire()
+        tokens, cancel = queue.Queue(), threading.Event()
+
+        def run():
+            try:
+                for token in self.provider.stream(messages, **opts):
+                    if cancel.is_set():
+                        break
+                    tokens.put(token)
+                tokens.put(_DONE)
+            except Exception as e:
+                tokens.put(e)
+            finally:
+                self._slots.release()
+
+        try:
+            self._pool.submit(run)
+        except Exception:
+            self._slots.release()
+            raise
+
+        try:
+            while True:
+                try:
+                    item = tokens.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise ChatTimeout()
+                if item is _DONE:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancel.set()
+
+
+def init_app(app):
+    app.config.setdefault("CHATBOT_PROVIDER", os.getenv("CHATBOT_PROVIDER", "openai"))
+    app.config.setdefault("CHATBOT_MODEL", os.getenv("CHATBOT_MODEL", DEFAULT_MODEL))
+    app.config.setdefault("CHATBOT_WORKERS", int(os.getenv("CHATBOT_WORKERS", "4")))
+    app.config.setdefault("CHATBOT_TIMEOUT", float(os.getenv("CHATBOT_TIMEOUT", "30")))
+    app.config.setdefault("CHATBOT_FAKE_DELAY", float(os.getenv("CHATBOT_FAKE_DELAY", "0.02")))
+    app.config.setdefault("CHATBOT_CACHE_ENABLED", os.getenv("CHATBOT_CACHE_ENABLED", "1") == "1")
+    app.config.setdefault("CHATBOT_CACHE_PATH", os.getenv(
+        "CHATBOT_CACHE_PATH", os.path.join(app.instance_path, "chatbot_cache.sqlite")))
+    app.config.setdefault("CHATBOT_CACHE_TTL", int(os.getenv("CHATBOT_CACHE_TTL", "86400")))
+    app.config.setdefault("CHATBOT_CACHE_SIZE", int(os.getenv("CHATBOT_CACHE_SIZE", "1000")))
+
+    cache = None
+    if app.config["CHATBOT_CACHE_ENABLED"]:
+        cache = ResponseCache(
+            app.config["CHATBOT_CACHE_PATH"],
+            ttl=app.config["CHATBOT_CACHE_TTL"],
+            max_entries=app.config["CHATBOT_CACHE_SIZE"],
+        )
+    app.extensions["chatbot"] = ChatBackend(
+        provider_from_config(app.config),
+        workers=app.config["CHATBOT_WORKERS"],
+        timeout=app.config["CHATBOT_TIMEOUT"],
+        cache=cache,
+        model=f'{app.config["CHATBOT_PROVIDER"]}:{app.config["CHATBOT_MODEL"]}',
+    )
+    return app.extensions["chatbot"]
+
+
+def build_messages(user_message, system_prompt=SYSTEM_PROMPT):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message},
+    ]
@@ -0,0 +1,60 @@
+# commitsync.py — keep per-process in-memory caches in step with committed writes.
+# Each cache module (kitchen_context, allergens, units) owns one CommitSync.
+# Its ORM event handlers record what a session changed — row-level changes
+# taken from the flushed objects, or whole sections marked stale when a bulk
+# statement bypassed the mapper events — in session.info. On commit every
+# registered cache gets apply(changes, stale); on rollback it is dropped.
+# Only this process's sessions are seen: writes made by other gunicorn workers
+# reach a cache when its own max_age runs out.
+
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+
+class CommitSync:
+    def __init__(self, key):
+        self.key = key                  # session.info slot
+        self._caches = weakref.WeakSet()
+        self._wired = False
+
+    def register(self, cache):
+        """`cache` needs apply(changes, stale): a list of changes and a set of stale sections."""
+        self._caches.add(cache)
+        return cache
+
+    def _pending(self, session):
+        return session.info.setdefault(self.key, {"changes": [], "stale": set()})
+
+    def change(self, target, change):
+        """Record a row-level change made through ORM object `target`."""
+        self._pending(object_session(target))["changes"].append(change)
+
+    def stale(self, session, section):
+        self._pending(session)["stale"].add(section)
+
+    def _on_commit(self, session):
+        pending = session.info.pop(self.key, None)
+        if not pending:
+            return
+        for cache in list(self._caches):
+            cache.apply(pending["changes"], pending["stale"])
+
+    def _on_rollback(self, session):
+        session.info.pop(self.key, None)
+
+    def wire(self, mapper_events=(), on_execute=None):
+        """
+        Listen once per process. mapper_events: (model, event name, handler)
+        triples; on_execute: a do_orm_execute handler for bulk statements.
+        """
+        if self._wired:
+            return
+        for model, name, handler in mapper_events:
+            event.listen(model, name, handler)
+        if on_execute is not None:
+            event.listen(Session, "do_orm_execute", on_execute)
+        event.listen(Session, "after_commit", self._on_commit)
+        event.listen(Session, "after_rollback", self._on_rollback)
+        self._wired = True
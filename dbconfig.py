@@ -0,0 +1,103 @@
+# dbconfig.py — database engine profiles.
+# DB_PROFILE picks how the engine is set up:
+#   tuned (default)  SQLite: WAL journal, busy_timeout, synchronous=NORMAL,
+#                    mmap and page cache set on every new connection, so
+#                    readers never block the writer and concurrent writers
+#                    queue instead of failing with "database is locked".
+#                    Postgres: sized pool, pre-ping, recycle, statement timeout.
+#   plain            library defaults (rollback journal, no timeouts), kept
+#                    for comparison; see bench_db.py.
+# Every knob can be overridden individually through the environment.
+
+import os
+
+from sqlalchemy import event
+
+PROFILES = ("tuned", "plain")
+
+
+def _env_int(name, default):
+    return int(os.getenv(name, str(default)))
+
+
+def configure(app):
+    """Fill in profile settings and SQLALCHEMY_ENGINE_OPTIONS; call before db.init_app(app)."""
+    app.config.setdefault("DB_PROFILE", os.getenv("DB_PROFILE", "tuned"))
+    if app.config["DB_PROFILE"] not in PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE {app.config['DB_PROFILE']!r} (expected one of {PROFILES})")
+    # SQLite
+    app.config.setdefault("SQLITE_JOURNAL_MODE", os.getenv("SQLITE_JOURNAL_MODE", "WAL"))
+    app.config.setdefault("SQLITE_BUSY_TIMEOUT_MS", _env_int("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    app.config.setdefault("SQLITE_SYNCHRONOUS", os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"))
+    app.config.setdefault("SQLITE_MMAP_SIZE", _env_int("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    # Negative = KiB, so -65536 is a 64 MiB page cache per connection
+    app.config.setdefault("SQLITE_CACHE_SIZE", _env_int("SQLITE_CACHE_SIZE", -65536))
+    # Postgres
+    app.config.setdefault("DB_POOL_SIZE", _env_int("DB_POOL_SIZE", 5))
+    app.config.setdefault("DB_MAX_OVERFLOW", _env_int("DB_MAX_OVERFLOW", 10))
+    app.config.setdefault("DB_POOL_TIMEOUT", _env_int("DB_POOL_TIMEOUT", 30))
+    app.config.setdefault("DB_POOL_RECYCLE", _env_int("DB_POOL_RECYCLE", 1800))
+    app.config.setdefault("DB_STATEMENT_TIMEOUT_MS", _env_int("DB_STATEMENT_TIMEOUT_MS", 30000))
+
+    options = engine_options(app.config["SQLALCHEMY_DATABASE_URI"], app.config)
+    app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {}).update(options)
+
+
+def engine_options(uri, config):
+    """create_engine() keyword arguments for `uri` under config["DB_PROFILE"]."""
+    if config["DB_PROFILE"] == "plain":
+        return {}
+    if uri.startswith("sqlite"):
+        # The driver's own lock wait, in seconds (busy_timeout is also set below).
+        return {"connect_args": {"timeout": config["SQLITE_BUSY_TIMEOUT_MS"] / 1000.0}}
+    if uri.startswith(("postgresql", "postgres")):
+        return {
+            "pool_size": config["DB_POOL_SIZE"],
+            "max_overflow": config["DB_MAX_OVERFLOW"],
+            "pool_timeout": config["DB_POOL_TIMEOUT"],
+            "pool_recycle": config["DB_POOL_RECYCLE"],
+            "pool_pre_ping": True,
+            "connect_args": {"options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"},
+        }
+    return {"pool_pre_ping": True}
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new SQLite connection under config["DB_PROFILE"]."""
+    if config["DB_PROFILE"] == "plain":
+        return []
+    return [
+        f"PRAGMA journal_mode={config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA busy_timeout={int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA synchronous={config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={int(config['SQLITE_MMAP_SIZE'])}",
+        f"PRAGMA cache_size={int(config['SQLITE_CACHE_SIZE'])}",
+    ]
+
+
+def install(engine, config):
+    """Run the profile's pragmas on each new connection of a SQLite engine."""
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(config)
+    if engine.url.database in (None, "", ":memory:") or "mode=ro" in str(engine.url):
+        # No journal to switch for in-memory or read-only (replica.py) connections
+        pragmas = [p for p in pragmas if not p.startswith("PRAGMA journal_mode")]
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        try:
+            for p in pragmas:
+                cur.execute(p)
+        finally:
+            cur.close()
+
+
+def init_app(app, db):
+    """configure() must already have run; hooks the pragmas onto db's engines."""
+    with app.app_context():
+        for engine in db.engines.values():
+            install(engine, app.config)
@@ -0,0 +1,108 @@
+# exports.py — streaming CSV exports.
+# Rows come off a yield_per cursor and are encoded in small chunks straight into
+# the response, so memory stays flat whatever the size of the export and the
+# download starts as soon as the first chunk is ready.
+
+import csv
+import io
+
+from flask import Response, stream_with_context
+from sqlalchemy import func
+
+from models import db, Resident, InventoryItem, Menu, MenuSchedule, MenuScheduleItem
+
+YIELD_PER = 1000
+CHUNK_ROWS = 500
+
+
+def csv_response(filename, header, rows):
+    """Stream `header` + `rows` (an iterable of sequences) as a CSV download."""
+    def generate():
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        # BOM so Excel opens UTF-8 correctly (matches the old utf-8-sig export)
+        buf.write("\ufeff")
+        w.writerow(header)
+        n = 0
+        for row in rows:
+            w.writerow(row)
+            n += 1
+            if n % CHUNK_ROWS == 0:
+                yield buf.getvalue().encode("utf-8")
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue().encode("utf-8")
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+INVENTORY_HEADER = ["Item", "Unit", "Quantity", "Low Stock Threshold", "Status"]
+
+
+def inventory_rows(q="", status="all"):
+    """(name, unit, qty, threshold, LOW/OK) rows, honoring the list filters."""
+    qty = func.coalesce(InventoryItem.quantity, 0)
+    thr = func.coalesce(InventoryItem.low_stock_threshold, 0)
+    stmt = db.select(InventoryItem.name, InventoryItem.unit, qty, thr, InventoryItem.is_low)
+    if q:
+        stmt = stmt.where(InventoryItem.name.ilike(f"%{q}%"))
+    if status == "low":
+        stmt = stmt.where(InventoryItem.is_low)
+    elif status == "ok":
+        stmt = stmt.where(~InventoryItem.is_low)
+    stmt = stmt.order_by(InventoryItem.name.asc())
+
+    for name, unit, quantity, threshold, is_low in _stream(stmt):
+        yield [name, unit, float(quantity), float(threshold), "LOW" if is_low else "OK"]
+
+
+RESIDENT_HEADER = ["Last Name", "First Name", "Birthday", "Diet", "Fluids",
+                   "Allergies", "Illnesses", "Medications", "Notes"]
+
+
+def resident_rows():
+    stmt = (db.select(Resident.last_name, Resident.first_name, Resident.birthday, Resident.diet,
+                      Resident.fluids, Resident.allergies, Resident.illnesses,
+                      Resident.medications, Resident.notes)
+            .order_by(Resident.last_name, Resident.first_name, Resident.id))
+    for r in _stream(stmt):
+        yield [r.last_name, r.first_name, r.birthday.strftime("%Y-%m-%d") if r.birthday else "",
+               r.diet or "", r.fluids or "", r.allergies or "", r.illnesses or "",
+               r.medications or "", r.notes or ""]
+
+
+SCHEDULE_HEADER = ["Date", "Meal", "Menu", "Item", "Unit", "Quantity Used", "Notes"]
+
+
+def schedule_rows(start=None, end=None):
+    """One row per scheduled item (schedules with no items still get one row)."""
+    stmt = (db.select(MenuSchedule.date, MenuSchedule.meal_type, Menu.title, InventoryItem.name,
+                      InventoryItem.unit, MenuScheduleItem.quantity_used, MenuSchedule.notes)
+            .select_from(MenuSchedule)
+            .outerjoin(Menu, Menu.id == MenuSchedule.menu_id)
+            .outerjoin(MenuScheduleItem, MenuScheduleItem.schedule_id == MenuSchedule.id)
+            .outerjoin(InventoryItem, InventoryItem.id == MenuScheduleItem.inventory_id))
+    if start:
+        stmt = stmt.where(MenuSchedule.date >= start)
+    if end:
+        stmt = stmt.where(MenuSchedule.date <= end)
+    stmt = stmt.order_by(MenuSchedule.date, MenuSchedule.meal_type, MenuScheduleItem.id)
+
+    for r in _stream(stmt):
+        yield [r.date.strftime("%Y-%m-%d"), r.meal_type, r.title or "(untitled)",
+               r.name or "", r.unit or "",
+               "" if r.quantity_used is None else float(r.quantity_used), r.notes or ""]
+
+
+def _stream(stmt):
+    # Server-side cursor where the driver supports it (psycopg2); SQLite steps
+    # through the result lazily anyway.
+    result = db.session.execute(stmt.execution_options(yield_per=YIELD_PER))
+    try:
+        yield from result
+    finally:
+        result.close()
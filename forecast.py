@@ -0,0 +1,139 @@
+# forecast.py — stock-out forecast from the planned schedule.
+# Scheduled usage is deducted from InventoryItem.quantity when a day is saved,
+# so the stored quantity is already net of every future meal. Stock on hand is
+# therefore quantity + the usage scheduled after today; the forecast walks that
+# amount down day by day. Today's meals count as served all day: there is no
+# record of which have gone out, and treating them as still in stock would
+# overstate on_hand until dinner, so the error falls on the cautious side.
+# Usage comes from one GROUP BY (inventory_id, date) query and the walk is a
+# NumPy cumulative sum over an items x days matrix, so 10k items x 90 days is a
+# few array passes.
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, func, type_coerce
+
+from models import db, InventoryItem, MenuSchedule, MenuScheduleItem
+
+DEFAULT_HORIZON = 90
+MAX_HORIZON = 366
+# Stock-outs extrapolated past the schedule further out than this are reported
+# as none: a slow mover's average pace says nothing about years ahead.
+MAX_STOCKOUT_DAYS = 365
+
+
+def horizon_arg(value, default=DEFAULT_HORIZON):
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(n, MAX_HORIZON))
+
+
+def _usage(after):
+    """(inventory_id, date, qty) for every scheduled day after `after`."""
+    # Dates come back raw (ISO text on SQLite) and are parsed by pandas in one
+    # vectorized pass instead of one Python date object per row.
+    stmt = (db.select(MenuScheduleItem.inventory_id, type_coerce(MenuSchedule.date, String),
+                      func.sum(MenuScheduleItem.quantity_used))
+            .join(MenuSchedule, MenuSchedule.id == MenuScheduleItem.schedule_id)
+            .where(MenuSchedule.date > after)
+            .group_by(MenuScheduleItem.inventory_id, MenuSchedule.date))
+    return _frame(stmt, ["inventory_id", "date", "qty"])
+
+
+def _frame(stmt, columns):
+    # Plain Core rows: no ORM row processing for what is just numbers and text.
+    rows = db.session.connection().execute(stmt).fetchall()
+    return pd.DataFrame.from_records(rows, columns=columns)
+
+
+def stockout_forecast(horizon=DEFAULT_HORIZON, today=None):
+    """
+    Project every item's stock over the next `horizon` days (day 1 = tomorrow;
+    today's meals count as served, so today is day 0 with nothing left to use).
+
+    Returns a DataFrame indexed by inventory_id with columns:
+      name, unit, quantity, low_stock_threshold
+      on_hand          stock left after today's meals (quantity + later usage)
+      planned_usage    scheduled usage within the horizon
+      daily_rate       planned_usage / horizon
+      low_date         first day projected at or under the threshold (or NaT)
+      stockout_date    first day projected to run out (or NaT)
+      days_until_stockout  days from today to stockout_date (NaN if none)
+      extrapolated     True when the stockout falls after the horizon and was
+                       estimated from daily_rate rather than the schedule;
+                       past MAX_STOCKOUT_DAYS no stockout is reported
+    """
+    today = today or date.today()
+    items = _frame(
+        db.select(InventoryItem.id, InventoryItem.name, InventoryItem.unit,
+                  InventoryItem.quantity, InventoryItem.low_stock_threshold).order_by(InventoryItem.id),
+        ["inventory_id", "name", "unit", "quantity", "low_stock_threshold"],
+    ).set_index("inventory_id")
+    items[["quantity", "low_stock_threshold"]] = items[["quantity", "low_stock_threshold"]].fillna(0.0)
+    n = len(items)
+
+    usage = _usage(today)
+    daily = np.zeros((n, horizon))
+    unserved = np.zeros(n)
+    if len(usage):
+        rows = items.index.get_indexer(usage["inventory_id"])
+        offsets = (pd.to_datetime(usage["date"]) - pd.Timestamp(today)).dt.days.to_numpy()
+        qty = usage["qty"].to_numpy(dtype=float)
+        known = rows >= 0
+        rows, offsets, qty = rows[known], offsets[known], qty[known]
+        np.add.at(unserved, rows, qty)
+        inside = offsets <= horizon
+        np.add.at(daily, (rows[inside], offsets[inside] - 1), qty[inside])
+
+    quantity = items["quantity"].to_numpy(dtype=float)
+    threshold = items["low_stock_threshold"].to_numpy(dtype=float)
+    on_hand = quantity + unserved
+    # Projected stock at the end of days 1..horizon.
+    projected = on_hand[:, None] - np.cumsum(daily, axis=1)
+    planned = daily.sum(axis=1)
+    rate = planned / horizon
+
+    def first_day(mask):
+        hit = mask.any(axis=1)
+        return np.where(hit, mask.argmax(axis=1) + 1, -1)
+
+    low_day = np.where(on_hand <= threshold, 0, first_day(projected <= threshold[:, None]))
+    out_day = np.where(on_hand <= 0, 0, first_day(projected <= 0)).astype(float)
+    out_day[out_day < 0] = np.nan
+
+    # Past the schedule, assume the horizon's average pace continues from the
+    # stock left at the end of its last day.
+    tail = np.isnan(out_day) & (rate > 0)
+    out_day[tail] = horizon + np.ceil(projected[tail, -1] / rate[tail])
+    beyond = tail & (out_day > MAX_STOCKOUT_DAYS)
+    out_day[beyond] = np.nan
+    tail &= ~beyond
+
+    base = np.datetime64(today, "D")
+    to_date = lambda days: np.where(np.isnan(days), np.datetime64("NaT"),
+                                    base + np.nan_to_num(days).astype("timedelta64[D]"))
+    items["on_hand"] = on_hand
+    items["planned_usage"] = planned
+    items["daily_rate"] = rate
+    items["low_date"] = to_date(np.where(low_day < 0, np.nan, low_day))
+    items["stockout_date"] = to_date(out_day)
+    items["days_until_stockout"] = out_day
+    items["extrapolated"] = tail
+    return items
+
+
+def forecast_rows(frame, only_at_risk=False, horizon=DEFAULT_HORIZON):
+    """Frame -> list of plain dicts (JSON/template friendly), soonest stockout first."""
+    if only_at_risk:
+        frame = frame[frame["low_date"].notna() | (frame["days_until_stockout"] <= horizon)]
+    frame = frame.sort_values(["days_until_stockout", "low_date", "name"], na_position="last")
+    out = frame.reset_index().rename(columns={"inventory_id": "id"})
+    for col in ("low_date", "stockout_date"):
+        out[col] = out[col].dt.strftime("%Y-%m-%d").astype(object).where(out[col].notna(), None)
+    out["days_until_stockout"] = out["days_until_stockout"].astype("Int64").astype(object).where(
+        out["days_until_stockout"].notna(), None)
+    return out.to_dict("records")
@@ -0,0 +1,232 @@
+# intake.py — bulk delivery intake.
+# A delivery manifest (CSV or JSON) is parsed and validated in one pass, the
+# items it names are looked up with one query, and stock is added with one
+# INSERT ... ON CONFLICT (name) DO UPDATE SET quantity = quantity + excluded,
+# so a few hundred lines cost a handful of round trips instead of one form
+# post (and one duplicate-name ILIKE) per item.
+
+import csv
+import io
+import json
+import math
+from datetime import datetime
+
+import click
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, InventoryItem
+import ledger
+
+# Rows per INSERT statement; keeps SQLite well under its bound-parameter limit.
+BATCH_ROWS = 500
+
+# Header spellings accepted for each field (lower-cased, spaces -> "_").
+_ALIASES = {
+    "name": "name", "item": "name", "item_name": "name",
+    "unit": "unit", "units": "unit",
+    "quantity": "quantity", "qty": "quantity", "delivered": "quantity",
+    "low_stock_threshold": "low_stock_threshold", "threshold": "low_stock_threshold",
+    "low_stock": "low_stock_threshold",
+}
+
+
+class ManifestError(ValueError):
+    """The manifest as a whole can't be read (bad JSON, no header, ...)."""
+
+
+def _field(key):
+    return _ALIASES.get(str(key).strip().lower().replace(" ", "_"))
+
+
+def parse_manifest(data, fmt=None):
+    """
+    Raw manifest (str or bytes) -> list of {field: raw value} dicts, one per line.
+    fmt is "csv" or "json"; when omitted it is sniffed from the first character.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    data = data.lstrip("\ufeff")
+    if fmt is None:
+        fmt = "json" if data.lstrip()[:1] in ("[", "{") else "csv"
+
+    if fmt == "json":
+        try:
+            doc = json.loads(data)
+        except ValueError as e:
+            raise ManifestError(f"Invalid JSON: {e}")
+        if isinstance(doc, dict):
+            doc = doc.get("items")
+        if not isinstance(doc, list):
+            raise ManifestError('JSON must be a list of items or {"items": [...]}.')
+        return [{_field(k): v for k, v in row.items() if _field(k)} if isinstance(row, dict) else {}
+                for row in doc]
+
+    reader = csv.reader(io.StringIO(data))
+    header = next(reader, None)
+    if not header or "name" not in {_field(h) for h in header}:
+        raise ManifestError("CSV needs a header row with at least Item/Name, Unit and Quantity.")
+    fields = [_field(h) for h in header]
+    return [{f: v for f, v in zip(fields, row) if f} for row in reader if any(c.strip() for c in row)]
+
+
+def _number(value, label, errors, required):
+    if value is None or str(value).strip() == "":
+        if required:
+            errors.append(f"{label} is required.")
+        return None
+    try:
+        n = float(value)
+    except (TypeError, ValueError):
+        errors.append(f"{label} must be a number.")
+        return None
+    if not math.isfinite(n):
+        errors.append(f"{label} must be a number.")
+        return None
+    if n < 0:
+        errors.append(f"{label} can't be negative.")
+        return None
+    return n
+
+
+def _report_line(n, raw, status, **extra):
+    return {"line": n, "name": str(raw.get("name") or "").strip(),
+            "unit": str(raw.get("unit") or "").strip(), "status": status, **extra}
+
+
+def _upsert_stmt(rows):
+    insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = insert(InventoryItem).values(rows)
+    excluded = stmt.excluded
+    return (stmt.on_conflict_do_update(
+                index_elements=[InventoryItem.name],
+                set_={
+                    "quantity": func.coalesce(InventoryItem.quantity, 0.0) + excluded.quantity,
+                    "low_stock_threshold": func.coalesce(excluded.low_stock_threshold,
+                                                         InventoryItem.low_stock_threshold),
+                    "updated_at": excluded.updated_at,
+                })
+            .returning(InventoryItem.id, InventoryItem.name, InventoryItem.quantity))
+
+
+def receive(lines, units, dry_run=False, user_id=None):
+    """
+    Validate manifest lines and add the delivered quantities to stock.
+
+    lines: output of parse_manifest(); units: the allowed unit names.
+    Lines that fail validation are reported and skipped; the rest are applied
+    (unless dry_run) with one upsert per BATCH_ROWS items. Repeated lines for
+    the same item are summed. The caller commits.
+
+    Returns a report: {"ok": n, "errors": n, "created": n, "updated": n,
+    "lines": [{"line", "name", "unit", "status", ...}, ...]}.
+    """
+    unit_lookup = {u.lower(): u for u in units}
+    report, valid = [], []
+    for n, raw in enumerate(lines, start=1):
+        errors = []
+        name = str(raw.get("name") or "").strip()
+        unit = unit_lookup.get(str(raw.get("unit") or "").strip().lower())
+        if not name:
+            errors.append("Item name is required.")
+        elif len(name) > InventoryItem.name.type.length:
+            errors.append(f"Item name is longer than {InventoryItem.name.type.length} characters.")
+        if unit is None:
+            errors.append(f"Unit must be one of: {', '.join(units)}.")
+        qty = _number(raw.get("quantity"), "Quantity", errors, required=True)
+        low = _number(raw.get("low_stock_threshold"), "Low stock threshold", errors, required=False)
+        if errors:
+            report.append(_report_line(n, raw, "error", errors=errors))
+        else:
+            report.append(_report_line(n, raw, "ok", quantity=qty))
+            valid.append((n, name, unit, qty, low))
+
+    # One lookup for every named item, matched case-insensitively like the forms.
+    wanted = {name.lower() for _, name, _, _, _ in valid}
+    existing = {}
+    if wanted:
+        for it in (db.session.query(InventoryItem.id, InventoryItem.name, InventoryItem.unit)
+                   .filter(func.lower(InventoryItem.name).in_(wanted))):
+            existing[it.name.lower()] = it
+
+    merged = {}   # stored name -> {"name", "unit", "quantity", "low_stock_threshold", "lines"}
+    for n, name, unit, qty, low in valid:
+        line = report[n - 1]
+        found = existing.get(name.lower())
+        if found is not None and (found.unit or "").lower() != unit.lower():
+            line.update(status="error",
+                        errors=[f'"{found.name}" is stocked in {found.unit}, not {unit}.'])
+            continue
+        key = found.name if found is not None else name
+        entry = merged.get(key.lower())
+        if entry is None:
+            # Existing items keep their threshold unless the line sets one.
+            entry = merged[key.lower()] = {"name": key, "unit": unit, "quantity": 0.0, "lines": [],
+                                           "low_stock_threshold": None if found is not None else 0.0}
+        elif entry["unit"].lower() != unit.lower():
+            line.update(status="error",
+                        errors=[f'"{key}" appears earlier in this delivery in {entry["unit"]}.'])
+            continue
+        entry["quantity"] += qty
+        if low is not None:
+            entry["low_stock_threshold"] = low
+        entry["lines"].append(line)
+        line["status"] = "updated" if found is not None else "created"
+
+    if merged and not dry_run:
+        now = datetime.utcnow()
+        entries = list(merged.values())
+        txns = []
+        for i in range(0, len(entries), BATCH_ROWS):
+            batch = entries[i:i + BATCH_ROWS]
+            rows = [{"name": e["name"], "unit": e["unit"], "quantity": e["quantity"],
+                     "low_stock_threshold": e["low_stock_threshold"], "updated_at": now}
+                    for e in batch]
+            by_name = {e["name"]: e for e in batch}
+            for iid, name, new_qty in db.session.execute(_upsert_stmt(rows)):
+                e = by_name[name]
+                txns.append((iid, e["quantity"], "delivery", None))
+                for line in e["lines"]:
+                    line.update(item_id=iid, new_quantity=float(new_qty or 0.0))
+        ledger.append_many(txns, user_id=user_id)
+
+    counts = {"created": 0, "updated": 0, "errors": 0}
+    for line in report:
+        key = "errors" if line["status"] == "error" else line["status"]
+        if key in counts:
+            counts[key] += 1
+    return {"ok": counts["created"] + counts["updated"], "dry_run": dry_run, **counts, "lines": report}
+
+
+def register_cli(group, units):
+    """Add `intake` to the `flask inventory` command group."""
+
+    @group.command("intake")
+    @click.argument("manifest", type=click.File("rb"))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "json"]),
+                  help="Manifest format; default: from the file extension, else sniffed.")
+    @click.option("--dry-run", is_flag=True, help="Validate and report without changing stock.")
+    def intake_cmd(manifest, fmt, dry_run):
+        """Add a delivery manifest (CSV or JSON) to inventory."""
+        name = getattr(manifest, "name", "") or ""
+        if fmt is None and name.lower().endswith((".csv", ".json")):
+            fmt = name.rsplit(".", 1)[1].lower()
+        try:
+            lines = parse_manifest(manifest.read(), fmt)
+        except ManifestError as e:
+            raise click.ClickException(str(e))
+        report = receive(lines, units, dry_run=dry_run)
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+            if report["ok"]:
+                # Cached menu pages show item names and units
+                current_app.extensions["page_cache"].invalidate()
+        for line in report["lines"]:
+            if line["status"] == "error":
+                click.echo(f'line {line["line"]}: {line["name"] or "?"}: ' + " ".join(line["errors"]), err=True)
+        click.echo(f'{"Checked" if dry_run else "Received"} {report["ok"]} line(s): '
+                   f'{report["created"]} new, {report["updated"]} restocked, {report["errors"]} error(s).')
@@ -0,0 +1,222 @@
+# kitchen_context.py — compact kitchen snapshot used to ground the chatbot.
+# The snapshot (resident diets/allergies, low-stock items, today's menu) lives in
+# memory and is kept current from ORM events: row-level changes are applied
+# from the flushed objects on commit, bulk statements mark their section stale
+# for a one-query rebuild. A chat request only reads the pre-rendered text.
+
+import os
+import threading
+import time
+from datetime import date
+
+from sqlalchemy.orm import joinedload, object_session
+
+from commitsync import CommitSync
+from models import db, Resident, InventoryItem, MenuSchedule
+
+MEAL_ORDER = {"Breakfast": 0, "Lunch": 1, "Dinner": 2}
+
+
+def estimate_tokens(text):
+    # ~4 characters per token for English text; close enough for budgeting.
+    return (len(text) + 3) // 4
+
+
+def resident_line(r):
+    parts = []
+    if r.diet:
+        parts.append(f"diet {r.diet}")
+    if r.allergies:
+        parts.append(f"allergies {r.allergies}")
+    if r.fluids:
+        parts.append(f"fluids {r.fluids}")
+    if not parts:
+        return None
+    return f"- {r.last_name}, {r.first_name}: " + "; ".join(parts)
+
+
+def low_stock_line(it):
+    if not it.is_low:
+        return None
+    qty = it.quantity or 0.0
+    thr = it.low_stock_threshold or 0.0
+    return f"- {it.name}: {qty:g} {it.unit or ''} (threshold {thr:g})".replace("  ", " ")
+
+
+class KitchenContext:
+    def __init__(self, token_budget=800, max_age=300):
+        self.token_budget = token_budget
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._residents = None    # {id: (sort_key, line)}
+        self._low = None          # {id: (sort_key, line)}
+        self._menu = None         # [line], built for self._menu_day
+        self._menu_day = None
+        self._built_at = {}
+        self._text = None
+
+    # ---- building (one query per stale section) ----
+    def _load_residents(self):
+        rows = {}
+        for r in Resident.query.all():
+            line = resident_line(r)
+            if line:
+                rows[r.id] = ((r.last_name or "", r.first_name or ""), line)
+        return rows
+
+    def _load_low(self):
+        rows = {}
+        for it in InventoryItem.query.filter(InventoryItem.is_low):
+            rows[it.id] = (it.name, low_stock_line(it))
+        return rows
+
+    def _load_menu(self, day):
+        scheds = (MenuSchedule.query.options(joinedload(MenuSchedule.menu))
+                  .filter(MenuSchedule.date == day).all())
+        scheds.sort(key=lambda s: MEAL_ORDER.get(s.meal_type, 99))
+        return [f"- {s.meal_type}: {s.menu.title if s.menu else '(untitled)'}" for s in scheds]
+
+    def _refresh(self):
+        now, today = time.time(), date.today()
+        stale = lambda name: now - self._built_at.get(name, 0) > self.max_age
+        if self._residents is None or stale("residents"):
+            self._residents = self._load_residents()
+            self._built_at["residents"] = now
+            self._text = None
+        self._refresh_low(now)
+        if self._menu is None or self._menu_day != today or stale("menu"):
+            self._menu, self._menu_day = self._load_menu(today), today
+            self._built_at["menu"] = now
+            self._text = None
+
+    def _refresh_low(self, now):
+        if self._low is None or now - self._built_at.get("low_stock", 0) > self.max_age:
+            self._low = self._load_low()
+            self._built_at["low_stock"] = now
+            self._text = None
+
+    def _render(self):
+        budget = self.token_budget
+        out = []
+
+        def add(title, lines, empty):
+            nonlocal budget
+            head = f"{title}:"
+            budget -= estimate_tokens(head)
+            out.append(head)
+            if not lines:
+                out.append(empty)
+                return
+            for i, line in enumerate(lines):
+                cost = estimate_tokens(line)
+                if cost > budget:
+                    out.append(f"- ... and {len(lines) - i} more")
+                    budget = 0
+                    return
+                out.append(line)
+                budget -= cost
+
+        add(f"Today's menu ({self._menu_day:%Y-%m-%d})", self._menu, "- nothing scheduled")
+        add("Low-stock inventory", [v[1] for v in sorted(self._low.values())], "- none")
+        add("Residents with diet/allergy/fluid orders", [v[1] for v in sorted(self._residents.values())], "- none")
+        return "\n".join(out)
+
+    def text(self):
+        """The snapshot as prompt text, within the token budget."""
+        with self._lock:
+            self._refresh()
+            if self._text is None:
+                self._text = self._render()
+            return self._text
+
+    def low_stock_count(self):
+        """Number of low-stock items, from the same cached section (no table scan)."""
+        with self._lock:
+            self._refresh_low(time.time())
+            return len(self._low)
+
+    # ---- incremental updates (called after commit) ----
+    def apply(self, changes, stale):
+        with self._lock:
+            for section in stale:
+                if section == "residents":
+                    self._residents = None
+                elif section == "low_stock":
+                    self._low = None
+                elif section == "menu":
+                    self._menu = None
+            for section, key, value in changes:
+                target = self._residents if section == "residents" else self._low
+                if target is None:
+                    continue
+                if value is None:
+                    target.pop(key, None)
+                else:
+                    target[key] = value
+            self._text = None
+
+
+# -------------------------- ORM event wiring --------------------------
+_sync = CommitSync("kitchen_context")
+
+
+def _on_resident(mapper, connection, target):
+    line = resident_line(target)
+    _sync.change(target, ("residents", target.id,
+                          ((target.last_name or "", target.first_name or ""), line) if line else None))
+
+
+def _on_resident_delete(mapper, connection, target):
+    _sync.change(target, ("residents", target.id, None))
+
+
+def _on_item(mapper, connection, target):
+    line = low_stock_line(target)
+    _sync.change(target, ("low_stock", target.id, (target.name, line) if line else None))
+
+
+def _on_item_delete(mapper, connection, target):
+    _sync.change(target, ("low_stock", target.id, None))
+
+
+def _on_schedule(mapper, connection, target):
+    _sync.stale(object_session(target), "menu")
+
+
+_BULK_SECTIONS = {Resident: "residents", InventoryItem: "low_stock", MenuSchedule: "menu"}
+
+
+def _on_orm_execute(state):
+    # Bulk INSERT/UPDATE/DELETE statements skip the mapper events above.
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return
+    for mapper in state.all_mappers:
+        section = _BULK_SECTIONS.get(mapper.class_)
+        if section:
+            _sync.stale(state.session, section)
+
+
+def _wire_events():
+    _sync.wire([
+        (Resident, "after_insert", _on_resident),
+        (Resident, "after_update", _on_resident),
+        (Resident, "after_delete", _on_resident_delete),
+        (InventoryItem, "after_insert", _on_item),
+        (InventoryItem, "after_update", _on_item),
+        (InventoryItem, "after_delete", _on_item_delete),
+        *((MenuSchedule, name, _on_schedule) for name in ("after_insert", "after_update", "after_delete")),
+    ], on_execute=_on_orm_execute)
+
+
+def init_app(app):
+    app.config.setdefault("CHATBOT_CONTEXT_ENABLED", os.getenv("CHATBOT_CONTEXT_ENABLED", "1") == "1")
+    app.config.setdefault("CHATBOT_CONTEXT_TOKENS", int(os.getenv("CHATBOT_CONTEXT_TOKENS", "800")))
+    # Changes made by other gunicorn workers are picked up after this many seconds
+    app.config.setdefault("CHATBOT_CONTEXT_MAX_AGE", int(os.getenv("CHATBOT_CONTEXT_MAX_AGE", "300")))
+    _wire_events()
+    ctx = _sync.register(KitchenContext(
+        token_budget=app.config["CHATBOT_CONTEXT_TOKENS"],
+        max_age=app.config["CHATBOT_CONTEXT_MAX_AGE"],
+    ))
+    app.extensions["kitchen_context"] = ctx
+    return ctx
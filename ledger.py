@@ -0,0 +1,236 @@
+# ledger.py — append-only inventory ledger.
+# Every quantity change is an InventoryTxn row; InventoryItem.quantity is kept as
+# the cached balance by applying each delta with a server-side
+# `quantity = quantity + :delta`, so concurrent writers add up instead of
+# overwriting each other. Periodic compaction writes InventorySnapshot rows, so
+# "stock as of X" is one index lookup plus a short scan of the txns after it.
+# Items that predate the ledger get an 'opening' txn for their balance the
+# first time they change, before that change's own txn. Non-finite deltas are
+# refused here, so no writer can store an infinite or NaN balance.
+
+import math
+from datetime import datetime
+
+import click
+from sqlalchemy import func, insert, update
+
+from models import db, InventoryItem, InventoryTxn, InventorySnapshot
+
+
+def _check(delta):
+    if not math.isfinite(delta):
+        raise ValueError(f"inventory delta must be finite, got {delta!r}")
+
+
+def _apply(inventory_id, delta):
+    qty = func.coalesce(InventoryItem.quantity, 0.0)
+    return db.session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id == inventory_id)
+        .values(quantity=qty + delta)
+        .returning(InventoryItem.quantity, InventoryItem.low_stock_threshold)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+
+def _open_missing(applied):
+    """
+    Items that predate the ledger get their 'opening' txn the first time they
+    change, so their txns always sum to the cached balance.
+    applied: {inventory_id: delta already applied to the balance (0 if none yet)}.
+    """
+    if not applied:
+        return
+    has_txn = {iid for (iid,) in (db.session.query(InventoryTxn.inventory_id)
+                                  .filter(InventoryTxn.inventory_id.in_(applied))
+                                  .distinct())}
+    missing = [iid for iid in applied if iid not in has_txn]
+    if not missing:
+        return
+    now = datetime.utcnow()
+    payload = [
+        {"inventory_id": iid, "delta": (qty or 0.0) - applied[iid], "source": "opening",
+         "ref_id": None, "user_id": None, "created_at": now}
+        for iid, qty in (db.session.query(InventoryItem.id, InventoryItem.quantity)
+                         .filter(InventoryItem.id.in_(missing)))
+    ]
+    payload = [row for row in payload if row["delta"]]
+    if payload:
+        db.session.execute(insert(InventoryTxn), payload)
+
+
+def record(inventory_id, delta, source, ref_id=None, user_id=None):
+    """
+    Append one txn and move the cached balance by `delta` (atomic in SQL).
+    Returns the item's new (quantity, low_stock_threshold), or None if there is
+    no such item.
+    """
+    if not delta:
+        return None
+    _check(delta)
+    _open_missing({inventory_id: 0.0})
+    db.session.add(InventoryTxn(inventory_id=inventory_id, delta=delta, source=source,
+                                ref_id=ref_id, user_id=user_id))
+    return _apply(inventory_id, delta)
+
+
+def append_many(rows, user_id=None):
+    """
+    Append txns whose deltas were already applied to the balances (e.g. by the
+    scheduler's conditional bulk UPDATE). rows: (inventory_id, delta, source, ref_id).
+    """
+    now = datetime.utcnow()
+    payload = [
+        {"inventory_id": inv_id, "delta": delta, "source": source, "ref_id": ref_id,
+         "user_id": user_id, "created_at": now}
+        for inv_id, delta, source, ref_id in rows if delta
+    ]
+    applied = {}
+    for row in payload:
+        _check(row["delta"])
+        applied[row["inventory_id"]] = applied.get(row["inventory_id"], 0.0) + row["delta"]
+    _open_missing(applied)
+    if payload:
+        db.session.execute(insert(InventoryTxn), payload)
+
+
+def set_quantity(item, new_qty, source="edit", user_id=None):
+    """Manual count: record the difference between the stored and the entered quantity."""
+    current = (db.session.query(InventoryItem.quantity)
+               .filter(InventoryItem.id == item.id)
+               .with_for_update()
+               .scalar()) or 0.0
+    record(item.id, (new_qty or 0.0) - current, source, user_id=user_id)
+    db.session.expire(item, ["quantity"])
+
+
+def open_item(item, source="create", user_id=None):
+    """Opening txn for a newly created item (call after flush so item.id exists)."""
+    if item.quantity:
+        _check(item.quantity)
+        db.session.add(InventoryTxn(inventory_id=item.id, delta=item.quantity,
+                                    source=source, user_id=user_id))
+
+
+def close_item(item, user_id=None):
+    """Closing txn before an item is deleted, so its history nets to zero."""
+    if item.quantity:
+        _open_missing({item.id: 0.0})
+        db.session.add(InventoryTxn(inventory_id=item.id, delta=-item.quantity,
+                                    source="delete", user_id=user_id))
+
+
+# -------------------------- reads --------------------------
+def history(inventory_id, limit=100, before_id=None):
+    q = InventoryTxn.query.filter(InventoryTxn.inventory_id == inventory_id)
+    if before_id:
+        q = q.filter(InventoryTxn.id < before_id)
+    return q.order_by(InventoryTxn.id.desc()).limit(limit).all()
+
+
+def balance_as_of(inventory_id, when):
+    """Balance at `when`: latest snapshot at or before it + the tail of txns after that."""
+    snap = (InventorySnapshot.query
+            .filter(InventorySnapshot.inventory_id == inventory_id, InventorySnapshot.as_of <= when)
+            .order_by(InventorySnapshot.as_of.desc(), InventorySnapshot.id.desc())
+            .first())
+    tail = db.session.query(func.coalesce(func.sum(InventoryTxn.delta), 0.0)).filter(
+        InventoryTxn.inventory_id == inventory_id,
+        InventoryTxn.id > (snap.through_txn_id if snap else 0),
+        InventoryTxn.created_at <= when,
+    ).scalar()
+    return (snap.balance if snap else 0.0) + (tail or 0.0)
+
+
+# -------------------------- maintenance --------------------------
+def ensure_opening_balances():
+    """Give items that predate the ledger an 'opening' txn for their current quantity."""
+    has_txn = db.session.query(InventoryTxn.inventory_id).distinct()
+    rows = (db.session.query(InventoryItem.id, InventoryItem.quantity)
+            .filter(~InventoryItem.id.in_(has_txn))
+            .all())
+    append_many((iid, qty or 0.0, "opening", None) for iid, qty in rows)
+    return len(rows)
+
+
+def _balances_through(cutoff_id):
+    """
+    ({inventory_id: balance}, {ids with txns since their last snapshot}) through
+    txn cutoff_id, built from the latest snapshots plus the tail after each.
+    """
+    latest = (db.session.query(InventorySnapshot.inventory_id,
+                               func.max(InventorySnapshot.through_txn_id).label("through"))
+              .group_by(InventorySnapshot.inventory_id)
+              .subquery())
+    base = dict(
+        db.session.query(InventorySnapshot.inventory_id, InventorySnapshot.balance)
+        .join(latest, (latest.c.inventory_id == InventorySnapshot.inventory_id)
+              & (latest.c.through == InventorySnapshot.through_txn_id))
+    )
+    tails = (db.session.query(InventoryTxn.inventory_id, func.sum(InventoryTxn.delta))
+             .outerjoin(latest, latest.c.inventory_id == InventoryTxn.inventory_id)
+             .filter(InventoryTxn.id > func.coalesce(latest.c.through, 0),
+                     InventoryTxn.id <= cutoff_id)
+             .group_by(InventoryTxn.inventory_id))
+    out, moved = dict(base), set()
+    for iid, total in tails:
+        out[iid] = out.get(iid, 0.0) + (total or 0.0)
+        moved.add(iid)
+    return out, moved
+
+
+def compact(cutoff=None):
+    """
+    Snapshot every item whose balance moved since its last snapshot, through the
+    last txn at or before `cutoff` (default: now). Returns the number written.
+    """
+    cutoff = cutoff or datetime.utcnow()
+    cutoff_id = (db.session.query(func.max(InventoryTxn.id))
+                 .filter(InventoryTxn.created_at <= cutoff).scalar())
+    if not cutoff_id:
+        return 0
+    balances, moved = _balances_through(cutoff_id)
+    rows = [{"inventory_id": iid, "as_of": cutoff, "through_txn_id": cutoff_id, "balance": bal}
+            for iid, bal in balances.items() if iid in moved]
+    if rows:
+        db.session.execute(insert(InventorySnapshot), rows)
+    return len(rows)
+
+
+def rebuild_balances():
+    """Recompute every cached InventoryItem.quantity from the ledger."""
+    cutoff_id = db.session.query(func.max(InventoryTxn.id)).scalar() or 0
+    balances, _ = _balances_through(cutoff_id)
+    fixed = 0
+    for it in InventoryItem.query:
+        bal = balances.get(it.id, 0.0)
+        if abs((it.quantity or 0.0) - bal) > 1e-9:
+            it.quantity = bal
+            fixed += 1
+    return fixed
+
+
+def register_cli(app):
+    @app.cli.group("inventory")
+    def inventory_cli():
+        """Inventory ledger maintenance."""
+
+    @inventory_cli.command("compact")
+    @click.option("--before", help="Snapshot through this date (YYYY-MM-DD); default now.")
+    def compact_cmd(before):
+        """Write balance snapshots so as-of queries only scan a short tail."""
+        cutoff = datetime.strptime(before, "%Y-%m-%d") if before else None
+        opened = ensure_opening_balances()
+        written = compact(cutoff)
+        db.session.commit()
+        click.echo(f"Opening balances: {opened}; snapshots written: {written}")
+
+    @inventory_cli.command("rebuild")
+    def rebuild_cmd():
+        """Recompute cached quantities from the ledger."""
+        opened = ensure_opening_balances()
+        fixed = rebuild_balances()
+        db.session.commit()
+        click.echo(f"Opening balances: {opened}; balances corrected: {fixed}")
+
+    return inventory_cli
@@ -0,0 +1,171 @@
+"""schema performance indexes
+
+Unique (date, meal_type) on menu_schedule (the scheduler's upsert target),
+indexes on the menu_schedule_item.schedule_id and menu_ingredient.menu_id
+foreign keys, and the tables/indexes added since the last revision (inventory
+ledger, pack sizes, resident seek key, low-stock partial index) for databases
+that predate them. Every step checks what already exists, so databases made by
+db.create_all() upgrade cleanly too.
+
+Revision ID: 3f9c2d7a41b6
+Revises: aaeeae02be22
+Create Date: 2026-10-16 09:12:44.318205
+
+"""
+import logging
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2d7a41b6'
+down_revision = 'aaeeae02be22'
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger('alembic.runtime.migration')
+
+# Tables created here for databases that predate them
+NEW_TABLES = ['pack_size', 'inventory_txn', 'inventory_snapshot']
+
+LOW_STOCK = "coalesce(quantity, 0) <= coalesce(low_stock_threshold, 0)"
+
+INDEXES = [
+    # (name, table, columns, unique, partial WHERE)
+    ('ux_menu_schedule_date_meal', 'menu_schedule', ['date', 'meal_type'], True, None),
+    ('ix_menu_schedule_item_schedule_id', 'menu_schedule_item', ['schedule_id'], False, None),
+    ('ix_menu_ingredient_menu_id', 'menu_ingredient', ['menu_id'], False, None),
+    ('ix_resident_name_seek', 'resident', ['last_name', 'first_name', 'id'], False, None),
+    ('ix_inventory_item_low', 'inventory_item', ['name'], False, LOW_STOCK),
+    ('ix_pack_size_inventory_id', 'pack_size', ['inventory_id'], False, None),
+    ('ix_inventory_txn_item_id', 'inventory_txn', ['inventory_id', 'id'], False, None),
+    ('ix_inventory_snapshot_item_as_of', 'inventory_snapshot', ['inventory_id', 'as_of'], False, None),
+]
+
+
+def _existing():
+    insp = sa.inspect(op.get_bind())
+    tables = set(insp.get_table_names())
+    indexes = {ix['name'] for t in tables for ix in insp.get_indexes(t)}
+    return tables, indexes
+
+
+def upgrade():
+    tables, indexes = _existing()
+
+    if 'pack_size' not in tables:
+        op.create_table('pack_size',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('inventory_id', sa.Integer(), nullable=False),
+        sa.Column('unit', sa.String(length=30), nullable=False),
+        sa.Column('quantity', sa.Float(), nullable=False),
+        sa.Column('per_unit', sa.String(length=30), nullable=False),
+        sa.ForeignKeyConstraint(['inventory_id'], ['inventory_item.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'inventory_txn' not in tables:
+        op.create_table('inventory_txn',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('inventory_id', sa.Integer(), nullable=False),
+        sa.Column('delta', sa.Float(), nullable=False),
+        sa.Column('source', sa.String(length=30), nullable=False),
+        sa.Column('ref_id', sa.Integer(), nullable=True),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+    if 'inventory_snapshot' not in tables:
+        op.create_table('inventory_snapshot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('inventory_id', sa.Integer(), nullable=False),
+        sa.Column('as_of', sa.DateTime(), nullable=False),
+        sa.Column('through_txn_id', sa.Integer(), nullable=False),
+        sa.Column('balance', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'ux_menu_schedule_date_meal' not in indexes:
+        _dedupe_schedules()
+
+    for name, table, columns, unique, where in INDEXES:
+        if name in indexes:
+            continue
+        kw = {'sqlite_where': sa.text(where), 'postgresql_where': sa.text(where)} if where else {}
+        op.create_index(name, table, columns, unique=unique, **kw)
+
+
+def _dedupe_schedules():
+    """
+    The old scheduler could leave several schedules in one slot; keep the
+    newest (what the views showed last) before enforcing uniqueness. The stock
+    each removed schedule deducted goes back to inventory, through the ledger,
+    and every removal is logged.
+    """
+    bind = op.get_bind()
+    newer = ("EXISTS (SELECT 1 FROM menu_schedule t WHERE t.date = s.date "
+             "AND t.meal_type = s.meal_type AND t.id > s.id)")
+    dupes = bind.execute(sa.text(
+        f"SELECT s.id, s.date, s.meal_type, s.menu_id FROM menu_schedule s WHERE {newer} ORDER BY s.id"
+    )).fetchall()
+    if not dupes:
+        return
+    ids = [row.id for row in dupes]
+    used = bind.execute(
+        sa.text("SELECT schedule_id, inventory_id, SUM(quantity_used) AS qty FROM menu_schedule_item "
+                "WHERE schedule_id IN :ids GROUP BY schedule_id, inventory_id")
+        .bindparams(sa.bindparam('ids', expanding=True)),
+        {'ids': ids},
+    ).fetchall()
+
+    now = datetime.utcnow()
+    restock = {}
+    for row in used:
+        restock[row.inventory_id] = restock.get(row.inventory_id, 0.0) + (row.qty or 0.0)
+    items = sa.table('inventory_item', sa.column('id'), sa.column('quantity'))
+    txn = sa.table('inventory_txn', sa.column('inventory_id'), sa.column('delta'), sa.column('source'),
+                   sa.column('ref_id'), sa.column('created_at'))
+    existing = {iid for (iid,) in bind.execute(sa.select(items.c.id).where(items.c.id.in_(list(restock))))}
+    opened = {iid for (iid,) in bind.execute(
+        sa.select(txn.c.inventory_id).where(txn.c.inventory_id.in_(list(existing))).distinct())}
+    # Items with no ledger yet get their opening balance first, so the
+    # restock txns below sum to the new quantity.
+    opening = [{'inventory_id': iid, 'delta': qty or 0.0, 'source': 'opening', 'ref_id': None,
+                'created_at': now}
+               for iid, qty in bind.execute(sa.select(items.c.id, items.c.quantity)
+                                            .where(items.c.id.in_(list(existing - opened))))
+               if qty]
+    if opening:
+        op.bulk_insert(txn, opening)
+    returned = [{'inventory_id': row.inventory_id, 'delta': row.qty, 'source': 'dedupe',
+                 'ref_id': row.schedule_id, 'created_at': now}
+                for row in used if row.inventory_id in existing and row.qty]
+    if returned:
+        op.bulk_insert(txn, returned)
+    for iid in existing:
+        if restock[iid]:
+            bind.execute(items.update().where(items.c.id == iid)
+                         .values(quantity=sa.func.coalesce(items.c.quantity, 0.0) + restock[iid]))
+
+    for row in dupes:
+        log.warning("Removed duplicate schedule %s (%s %s, menu %s)", row.id, row.date, row.meal_type, row.menu_id)
+    for iid, qty in sorted(restock.items()):
+        if iid in existing:
+            log.warning("Returned %g to inventory item %s", qty, iid)
+        else:
+            log.warning("Inventory item %s no longer exists; %g not returned", iid, qty)
+
+    for table, column in (('menu_schedule_item', 'schedule_id'), ('menu_schedule', 'id')):
+        bind.execute(sa.text(f"DELETE FROM {table} WHERE {column} IN :ids")
+                     .bindparams(sa.bindparam('ids', expanding=True)), {'ids': ids})
+
+
+def downgrade():
+    tables, indexes = _existing()
+    for name, table, _, _, _ in INDEXES:
+        if name in indexes and table not in NEW_TABLES:
+            op.drop_index(name, table_name=table)
+    for table in NEW_TABLES:
+        if table in tables:
+            op.drop_table(table)
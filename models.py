@@ -2,9 +2,14 @@
 from datetime import datetime, date
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import func, literal_column
+from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import relationship
 
-db = SQLAlchemy()
+from replica import RoutingSession
+
+# Reads may be routed to a replica bind during GET requests (replica.py)
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 # -----------------------------
 # User
@@ -48,6 +53,9 @@ class Resident(db.Model):
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Seek key for keyset pagination of the residents list
+    __table_args__ = (db.Index("ix_resident_name_seek", "last_name", "first_name", "id"),)
+
     @property
     def age(self) -> int | None:
         """Compute age from birthday (shown in list, not stored)."""
@@ -63,6 +71,11 @@ class Resident(db.Model):
 # -----------------------------
 # InventoryItem
 # -----------------------------
+def is_low_stock(quantity, threshold):
+    """The low-stock rule: at or under the threshold (missing values count as 0)."""
+    return (quantity or 0.0) <= (threshold or 0.0)
+
+
 class InventoryItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(120), index=True, unique=True, nullable=False)
@@ -71,6 +84,45 @@ class InventoryItem(db.Model):
     low_stock_threshold = db.Column(db.Float, default=0)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    @hybrid_property
+    def is_low(self):
+        return is_low_stock(self.quantity, self.low_stock_threshold)
+
+    @is_low.expression
+    def is_low(cls):
+        # Literal zeros (not bound parameters) so the text matches the partial
+        # index below exactly; SQLite only uses a partial index on a match.
+        return (func.coalesce(cls.quantity, literal_column("0"))
+                <= func.coalesce(cls.low_stock_threshold, literal_column("0")))
+
+
+# Only low rows are indexed, in name order: `show=low` pages and the
+# low-stock count read just those rows instead of scanning the table.
+db.Index("ix_inventory_item_low", InventoryItem.name,
+         sqlite_where=InventoryItem.is_low, postgresql_where=InventoryItem.is_low)
+
+
+# -----------------------------
+# PackSize: per-item unit equivalence, "1 <unit> = <quantity> <per_unit>",
+# e.g. 1 cases = 24 cans of tomato sauce. Lets recipes and stock use
+# different pack units for the same item (see units.py).
+# -----------------------------
+class PackSize(db.Model):
+    __tablename__ = "pack_size"
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_id = db.Column(db.Integer, db.ForeignKey("inventory_item.id", ondelete="CASCADE"),
+                             nullable=False, index=True)
+    unit = db.Column(db.String(30), nullable=False)
+    quantity = db.Column(db.Float, nullable=False)
+    per_unit = db.Column(db.String(30), nullable=False)
+
+    inventory_item = relationship(
+        "InventoryItem", backref=db.backref("pack_sizes", cascade="all, delete-orphan"),
+    )
+
+    def __repr__(self):
+        return f"<PackSize item={self.inventory_id} 1 {self.unit} = {self.quantity:g} {self.per_unit}>"
+
 
 # =======================================================
 # 🧾 MENU MANAGEMENT AND SCHEDULER SYSTEM
@@ -97,7 +149,7 @@ class Menu(db.Model):
 class MenuIngredient(db.Model):
     __tablename__ = "menu_ingredient"
     id = db.Column(db.Integer, primary_key=True)
-    menu_id = db.Column(db.Integer, db.ForeignKey("menu.id"), nullable=False)
+    menu_id = db.Column(db.Integer, db.ForeignKey("menu.id"), nullable=False, index=True)
     inventory_id = db.Column(db.Integer, db.ForeignKey("inventory_item.id"), nullable=False)
     quantity = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(50))
@@ -118,7 +170,15 @@ class MenuSchedule(db.Model):
     meal_type = db.Column(db.String(50), nullable=False)
     menu_id = db.Column(db.Integer, db.ForeignKey("menu.id"))
     notes = db.Column(db.Text)
-    items = relationship("MenuScheduleItem", backref="schedule", cascade="all, delete-orphan")
+    menu = relationship("Menu")
+    items = relationship(
+        "MenuScheduleItem", backref="schedule", cascade="all, delete-orphan",
+        order_by="MenuScheduleItem.id",
+    )
+
+    # One schedule per slot; also the seek key for every date-range query and
+    # the conflict target of the scheduler's upsert (scheduling.save_schedules).
+    __table_args__ = (db.Index("ux_menu_schedule_date_meal", "date", "meal_type", unique=True),)
 
     def __repr__(self):
         return f"<MenuSchedule {self.date} {self.meal_type}>"
@@ -130,7 +190,7 @@ class MenuSchedule(db.Model):
 class MenuScheduleItem(db.Model):
     __tablename__ = "menu_schedule_item"
     id = db.Column(db.Integer, primary_key=True)
-    schedule_id = db.Column(db.Integer, db.ForeignKey("menu_schedule.id"), nullable=False)
+    schedule_id = db.Column(db.Integer, db.ForeignKey("menu_schedule.id"), nullable=False, index=True)
     inventory_id = db.Column(db.Integer, db.ForeignKey("inventory_item.id"), nullable=False)
     quantity_used = db.Column(db.Float, nullable=False)
 
@@ -138,3 +198,46 @@ class MenuScheduleItem(db.Model):
 
     def __repr__(self):
         return f"<MenuScheduleItem {self.inventory_item.name if self.inventory_item else ''} -{self.quantity_used}>"
+
+
+# =======================================================
+# 📒 INVENTORY LEDGER
+# =======================================================
+
+# -----------------------------
+# InventoryTxn: append-only record of every quantity change.
+# InventoryItem.quantity is the cached running balance of these rows.
+# inventory_id is deliberately not a foreign key: history outlives deleted items.
+# -----------------------------
+class InventoryTxn(db.Model):
+    __tablename__ = "inventory_txn"
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Float, nullable=False)
+    source = db.Column(db.String(30), nullable=False)   # opening, create, edit, bump, schedule, delete, ...
+    ref_id = db.Column(db.Integer)                       # e.g. MenuSchedule.id for source="schedule"
+    user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (db.Index("ix_inventory_txn_item_id", "inventory_id", "id"),)
+
+    def __repr__(self):
+        return f"<InventoryTxn item={self.inventory_id} {self.delta:+g} {self.source}>"
+
+
+# -----------------------------
+# InventorySnapshot: compacted balance of an item through a given txn id.
+# Balance as of time T = latest snapshot with as_of <= T + the txns after it.
+# -----------------------------
+class InventorySnapshot(db.Model):
+    __tablename__ = "inventory_snapshot"
+    id = db.Column(db.Integer, primary_key=True)
+    inventory_id = db.Column(db.Integer, nullable=False)
+    as_of = db.Column(db.DateTime, nullable=False)
+    through_txn_id = db.Column(db.Integer, nullable=False)
+    balance = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (db.Index("ix_inventory_snapshot_item_as_of", "inventory_id", "as_of"),)
+
+    def __repr__(self):
+        return f"<InventorySnapshot item={self.inventory_id} {self.as_of:%Y-%m-%d} {self.balance:g}>"
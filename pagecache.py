@@ -0,0 +1,119 @@
+# pagecache.py — server-side cache of rendered menu pages.
+# Pages are keyed by (route, date range, role, extra) and kept in a small SQLite
+# file, so every gunicorn worker reads the same entries and one worker's write
+# clears everyone's stale copies. Writers call invalidate() with the dates they
+# touched after committing; every cached page whose range overlaps is dropped.
+# An invalidation counter guards against a render that started before the
+# write being stored after it. Storage, LRU eviction beyond PAGE_CACHE_SIZE
+# and the PAGE_CACHE_TTL bound on anything no route invalidates come from
+# sqlitecache.SQLiteLRU.
+
+import os
+
+from flask import current_app, request, session
+
+from sqlitecache import SQLiteLRU
+
+
+def _day(d):
+    return d.isoformat() if d else None
+
+
+class PageCache(SQLiteLRU):
+    table = "page"
+    columns = (("route", "TEXT NOT NULL"), ("start", "TEXT"), ("end", "TEXT"),
+               ("role", "TEXT NOT NULL"), ("body", "BLOB NOT NULL"), ("etag", "TEXT"))
+    counters = ("generation", "hits", "misses")
+
+    def __init__(self, path, ttl=300, max_entries=500):
+        super().__init__(path, ttl, max_entries)
+
+    @staticmethod
+    def key_for(route, start, end, role, extra=""):
+        return "\x1f".join([route, _day(start) or "", _day(end) or "", role or "", extra])
+
+    def get(self, key):
+        """(body, etag) or None, plus the generation a fresh render must be stored under."""
+        with self.connect() as conn:
+            row = self.lookup(conn, key)
+            gen = self.counter(conn, "generation")
+        return (row[4], row[5]) if row else None, gen
+
+    def put(self, key, route, start, end, role, body, etag, generation):
+        """Store a render, unless something was invalidated since it started."""
+        super().put(key, (route, _day(start), _day(end), role or "", body, etag),
+                    only_if=("(SELECT value FROM meta WHERE name = 'generation') = ?", (generation,)))
+
+    def invalidate(self, start=None, end=None):
+        """
+        Drop every page whose date range overlaps [start, end]; pages without a
+        range (or with an open end) always overlap. No dates: drop everything.
+        """
+        start, end = _day(start), _day(end or start)
+        with self.connect() as conn:
+            self.bump(conn, "generation")
+            if start is None:
+                conn.execute("DELETE FROM page")
+            else:
+                conn.execute(
+                    """DELETE FROM page
+                       WHERE (start IS NULL OR start <= ?) AND ("end" IS NULL OR "end" >= ?)""",
+                    (end, start),
+                )
+
+    def respond(self, route, start, end, role, render, extra=""):
+        """
+        Serve a cached copy of the page, or call render() (-> str or Response)
+        and cache it when it is a plain 200 HTML page. Conditional requests
+        against a stored ETag get a 304.
+        """
+        # A pending flash is shown by (and popped in) a real render, never cached.
+        if session.get("_flashes"):
+            return render()
+        key = self.key_for(route, start, end, role, extra)
+        hit, generation = self.get(key)
+        if hit:
+            body, etag = hit
+            resp = current_app.response_class(body, mimetype="text/html")
+            if etag:
+                resp.set_etag(etag)
+                resp.headers["Cache-Control"] = "private, no-cache"
+                if request.if_none_match.contains(etag):
+                    resp = current_app.response_class(status=304, headers=resp.headers)
+            resp.headers["X-Page-Cache"] = "hit"
+            return resp
+
+        resp = current_app.make_response(render())
+        if (resp.status_code == 200 and resp.mimetype == "text/html"
+                and not resp.is_streamed and not session.get("_flashes")):
+            self.put(key, route, start, end, role, resp.get_data(), resp.get_etag()[0], generation)
+        resp.headers["X-Page-Cache"] = "miss"
+        return resp
+
+
+class _NoCache:
+    """Stand-in when PAGE_CACHE_ENABLED is off: always renders."""
+
+    def respond(self, route, start, end, role, render, extra=""):
+        return render()
+
+    def invalidate(self, start=None, end=None):
+        pass
+
+
+def init_app(app):
+    app.config.setdefault("PAGE_CACHE_ENABLED", os.getenv("PAGE_CACHE_ENABLED", "1") == "1")
+    app.config.setdefault("PAGE_CACHE_PATH", os.getenv(
+        "PAGE_CACHE_PATH", os.path.join(app.instance_path, "page_cache.sqlite")))
+    app.config.setdefault("PAGE_CACHE_TTL", int(os.getenv("PAGE_CACHE_TTL", "300")))
+    app.config.setdefault("PAGE_CACHE_SIZE", int(os.getenv("PAGE_CACHE_SIZE", "500")))
+
+    cache = _NoCache()
+    if app.config["PAGE_CACHE_ENABLED"]:
+        cache = PageCache(
+            app.config["PAGE_CACHE_PATH"],
+            ttl=app.config["PAGE_CACHE_TTL"],
+            max_entries=app.config["PAGE_CACHE_SIZE"],
+        )
+    app.extensions["page_cache"] = cache
+    return cache
@@ -0,0 +1,107 @@
+# pagination.py — keyset (seek) pagination for the list pages.
+# A page is "rows after this sort key", so page N costs the same index seek as
+# page 1 instead of an OFFSET scan. Pages are lazy: rows are pulled from the
+# cursor while the template renders them, which keeps streamed responses flowing.
+
+import base64
+import json
+
+from sqlalchemy import tuple_
+
+DEFAULT_PER_PAGE = 100
+MAX_PER_PAGE = 500
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+        return values if isinstance(values, list) else None
+    except Exception:
+        return None
+
+
+def per_page_arg(value, default=DEFAULT_PER_PAGE):
+    try:
+        n = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(n, MAX_PER_PAGE))
+
+
+class KeysetPage:
+    """
+    Iterable page of rows. `next_cursor` / `has_more` are known once the rows
+    have been iterated, which in a template means by the time the footer with
+    the "Next" link is rendered.
+    """
+
+    def __init__(self, query, keys, row_key, after=None, per_page=DEFAULT_PER_PAGE, transform=None):
+        self.per_page = per_page
+        self.after = after
+        self.next_cursor = None
+        self._row_key = row_key
+        self._transform = transform or (lambda row: row)
+        self._rows = None
+        if after is not None and len(after) == len(keys):
+            query = query.filter(tuple_(*keys) > tuple_(*after))
+        self._query = query.order_by(*keys).limit(per_page + 1)
+
+    @property
+    def is_first(self):
+        return self.after is None
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        if self._rows is not None:
+            yield from self._rows
+            return
+        rows, last = [], None
+        for i, row in enumerate(self._query.yield_per(min(self.per_page + 1, 200))):
+            if i == self.per_page:
+                self.next_cursor = encode_cursor(self._row_key(last))
+                break
+            last = row
+            out = self._transform(row)
+            rows.append(out)
+            yield out
+        self._rows = rows
+
+    def __len__(self):
+        if self._rows is None:
+            for _ in self:
+                pass
+        return len(self._rows)
+
+    def __bool__(self):
+        return len(self) > 0
+
+
+class RankedPage(KeysetPage):
+    """
+    Page over a relevance-ordered query (full-text search). Rank isn't a stable
+    seek key, so the cursor carries an offset; search result sets are already
+    narrowed by the index, which keeps the OFFSET cheap.
+    """
+
+    def __init__(self, query, after=None, per_page=DEFAULT_PER_PAGE, transform=None):
+        self.per_page = per_page
+        self.after = after
+        self.next_cursor = None
+        self._transform = transform or (lambda row: row)
+        self._rows = None
+        # A tampered cursor (not a non-negative offset) is ignored, as KeysetPage
+        # ignores keys that don't fit; Postgres rejects a negative OFFSET.
+        start = after[0] if after and type(after[0]) is int and after[0] >= 0 else 0
+        self._row_key = lambda row: [start + per_page]
+        self._query = query.offset(start).limit(per_page + 1)
@@ -0,0 +1,91 @@
+# replica.py — read-replica routing for GET traffic.
+# With DATABASE_READ_URL set (or DATABASE_READ_LOCAL=1 on SQLite, which opens
+# the same file through a separate read-only connection) a "replica" bind is
+# added and db.session sends reads there while a GET/HEAD request is handled.
+# Everything else stays on the primary:
+#   - writes (flushes and INSERT/UPDATE/DELETE statements), and every statement
+#     after the request's first write, so it reads its own writes;
+#   - views marked @use_primary (GET handlers with side effects);
+#   - for REPLICA_STICKY_SECONDS after a user's write, that user's requests,
+#     so the page after a POST/redirect doesn't show replica lag;
+#   - CLI commands and anything else outside a request.
+
+import os
+import time
+
+from flask import g, has_request_context, request, session as http_session
+from flask_sqlalchemy.session import Session
+
+REPLICA = "replica"
+_STICKY_KEY = "_db_primary_until"
+
+
+class RoutingSession(Session):
+    """db.session class: picks the replica bind for reads when the request allows it."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            writing = self._flushing or getattr(clause, "is_dml", False)
+            if writing:
+                self.info["db_wrote"] = True
+            elif not self.info.get("db_wrote") and _reads_from_replica():
+                return self._db.engines[REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _reads_from_replica():
+    return has_request_context() and g.get("db_replica", False)
+
+
+def use_primary(view):
+    """Mark a GET view that writes (or must read fresh data) to stay on the primary."""
+    view.db_primary = True
+    return view
+
+
+def replica_url(config):
+    """The replica URL to bind, or None when read routing is off."""
+    if config.get("DATABASE_READ_URL"):
+        return config["DATABASE_READ_URL"]
+    uri = config["SQLALCHEMY_DATABASE_URI"]
+    if config.get("DATABASE_READ_LOCAL") and uri.startswith("sqlite:///") and ":memory:" not in uri:
+        # Same file, read-only connection: a local stand-in for a real replica.
+        path = uri[len("sqlite:///"):]
+        return f"sqlite:///file:{path}?mode=ro&uri=true"
+    return None
+
+
+def configure(app):
+    """Add the replica bind; call before db.init_app(app)."""
+    app.config.setdefault("DATABASE_READ_URL", os.getenv("DATABASE_READ_URL", ""))
+    app.config.setdefault("DATABASE_READ_LOCAL", os.getenv("DATABASE_READ_LOCAL", "0") == "1")
+    app.config.setdefault("REPLICA_STICKY_SECONDS", float(os.getenv("REPLICA_STICKY_SECONDS", "5")))
+    url = replica_url(app.config)
+    if url:
+        app.config.setdefault("SQLALCHEMY_BINDS", {})[REPLICA] = url
+    return url
+
+
+def init_app(app, db):
+    """Route GET reads once configure() has added the bind; no-op otherwise."""
+    if REPLICA not in app.config.get("SQLALCHEMY_BINDS", {}):
+        return False
+
+    @app.before_request
+    def _choose_bind():
+        view = app.view_functions.get(request.endpoint)
+        g.db_replica = (
+            request.method in ("GET", "HEAD")
+            and not getattr(view, "db_primary", False)
+            and http_session.get(_STICKY_KEY, 0) < time.time()
+        )
+
+    @app.after_request
+    def _stick_after_write(response):
+        if db.session().info.get("db_wrote"):
+            http_session[_STICKY_KEY] = time.time() + app.config["REPLICA_STICKY_SECONDS"]
+        elif _STICKY_KEY in http_session and http_session[_STICKY_KEY] < time.time():
+            http_session.pop(_STICKY_KEY, None)
+        return response
+
+    return True
@@ -0,0 +1,216 @@
+# scheduling.py — set-based inventory pre-check and deduction for the menu scheduler.
+# All chosen menus are resolved and aggregated in memory, affected inventory is
+# fetched with one IN query, and stock is deducted with one conditional UPDATE,
+# so saving a day (or many days) costs a fixed number of round trips.
+# Re-saving a slot that is already scheduled replaces its item rows, so the
+# stock those rows hold (held_usage) is counted as available in the pre-check,
+# netted out of the deduction, and given back in the ledger as 'reschedule'.
+
+from collections import defaultdict
+
+from sqlalchemy import case, delete, func, insert, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import selectinload
+
+from models import db, Menu, InventoryItem, MenuSchedule, MenuScheduleItem
+
+# Slots per upsert statement; keeps SQLite well under its bound-parameter limit.
+BATCH_ROWS = 500
+
+def held_usage(keys):
+    """
+    Stock held by the already-saved slots among `keys` ((day, meal_type) pairs),
+    in one query: [(schedule_id, inventory_id, qty), ...].
+    """
+    keys = set(keys)
+    if not keys:
+        return []
+    rows = db.session.execute(
+        db.select(MenuSchedule.id, MenuSchedule.date, MenuSchedule.meal_type,
+                  MenuScheduleItem.inventory_id, func.sum(MenuScheduleItem.quantity_used))
+        .join(MenuScheduleItem, MenuScheduleItem.schedule_id == MenuSchedule.id)
+        .where(MenuSchedule.date.in_({d for d, _ in keys}),
+               MenuSchedule.meal_type.in_({mt for _, mt in keys}))
+        .group_by(MenuSchedule.id, MenuSchedule.date, MenuSchedule.meal_type, MenuScheduleItem.inventory_id)
+    )
+    return [(sid, inv_id, q or 0.0) for sid, d, mt, inv_id, q in rows if (d, mt) in keys]
+
+
+def plan_requirements(chosen, qty_for=None, units=None, held=()):
+    """
+    Resolve chosen menus into per-slot ingredient lines and a stock check.
+
+    chosen:  {slot_key: menu_id}; slot_key is anything hashable whose label is
+             useful in messages (a meal type, or a (date, meal_type) pair).
+    qty_for: optional callable(slot_key, MenuIngredient) -> quantity, used for
+             per-ingredient overrides; defaults to the menu's own quantity.
+    units:   optional units.UnitTable; ingredient quantities entered in another
+             unit than the item's stock unit are converted in one pass.
+    held:    held_usage() of the slots being replaced; that stock is freed by
+             the save, so it counts as available and is netted out of `need`.
+
+    Returns a dict:
+      lines:  {slot_key: [(inventory_id, qty in stock units), ...]}
+      need:   {inventory_id: qty to deduct across all slots, net of `held`
+               (negative when a re-plan gives stock back)}
+      items:  {inventory_id: InventoryItem}
+      errors: human-readable problems (missing menus/items, shortfalls)
+    """
+    menu_ids = set(chosen.values())
+    menus = {}
+    if menu_ids:
+        menus = {
+            m.id: m for m in (Menu.query
+                              .options(selectinload(Menu.ingredients))
+                              .filter(Menu.id.in_(menu_ids)))
+        }
+
+    raw, errors = [], []   # raw: (slot_key, inventory_id, qty, unit)
+    for key, mid in chosen.items():
+        m = menus.get(mid)
+        if not m:
+            errors.append(f"Menu #{mid} for {_label(key)} no longer exists")
+            continue
+        for ing in m.ingredients:
+            q = qty_for(key, ing) if qty_for else ing.quantity
+            raw.append((key, ing.inventory_id, q or 0.0, ing.unit))
+
+    freed = defaultdict(float)
+    for _, inv_id, q in held:
+        freed[inv_id] += q
+
+    items = {}
+    if raw or freed:
+        ids = {inv_id for _, inv_id, _, _ in raw} | set(freed)
+        items = {it.id: it for it in InventoryItem.query.filter(InventoryItem.id.in_(ids))}
+
+    qtys = [q for _, _, q, _ in raw]
+    if units is not None and raw:
+        qtys = units.to_stock(
+            [inv_id for _, inv_id, _, _ in raw],
+            [u for _, _, _, u in raw],
+            [items[inv_id].unit if inv_id in items else u for _, inv_id, _, u in raw],
+            qtys,
+        ).tolist()
+
+    lines = {key: [] for key, mid in chosen.items() if mid in menus}
+    need = defaultdict(float)
+    missing_in = set()
+    for (key, inv_id, q_in, unit), q in zip(raw, qtys):
+        inv = items.get(inv_id)
+        if not inv:
+            missing_in.add(_label(key))
+            continue
+        if q != q:   # NaN: no known conversion
+            errors.append(f"Can't convert {unit} to {inv.unit} for {inv.name} in {_label(key)}; "
+                          f"add a pack size for it in Inventory")
+            continue
+        lines[key].append((inv_id, q))
+        need[inv_id] += q
+
+    for lbl in sorted(missing_in):
+        errors.append(f"Inventory item missing for a menu ingredient in {lbl}")
+
+    for inv_id, total in need.items():
+        inv = items[inv_id]
+        have = (inv.quantity or 0.0) + freed.get(inv_id, 0.0)
+        if have < total:
+            errors.append(f"{inv.name} needs {total:g}{inv.unit} (have {have:g})")
+
+    # Items deleted since the replaced slots were saved have nothing to return to.
+    for inv_id, q in freed.items():
+        if inv_id in items:
+            need[inv_id] -= q
+
+    return {"lines": lines, "need": dict(need), "items": items, "errors": errors}
+
+
+def apply_deductions(need):
+    """
+    Deduct every requirement in a single conditional UPDATE:
+
+        UPDATE inventory_item
+           SET quantity = quantity - CASE id WHEN .. THEN .. END
+         WHERE id IN (..) AND quantity >= CASE id WHEN .. THEN .. END
+
+    Returns True when every row was updated. False means another writer drained
+    stock between the pre-check and this statement; the caller should roll back.
+    Negative amounts (stock freed by a re-plan) are added back.
+    """
+    need = {k: v for k, v in need.items() if v}
+    if not need:
+        return True
+    qty = func.coalesce(InventoryItem.quantity, 0.0)
+    amount = case(need, value=InventoryItem.id)
+    res = db.session.execute(
+        update(InventoryItem)
+        .where(InventoryItem.id.in_(need), qty >= amount)
+        .values(quantity=qty - amount)
+        .execution_options(synchronize_session=False)
+    )
+    return res.rowcount == len(need)
+
+
+def ledger_rows(schedule_ids, lines, held=(), items=None):
+    """
+    Ledger txns for saved slots: one (inventory_id, -qty, "schedule", schedule_id)
+    per line, after one (inventory_id, +qty, "reschedule", schedule_id) per
+    replaced `held` row still in `items` (plan_requirements' items).
+    """
+    returned = [(inv_id, q, "reschedule", sid) for sid, inv_id, q in held
+                if items is None or inv_id in items]
+    return returned + [
+        (inv_id, -q, "schedule", schedule_ids[(day, meal_type)])
+        for (day, meal_type), rows in lines.items()
+        for inv_id, q in rows
+    ]
+
+
+def _upsert_stmt(rows):
+    dialect_insert = pg_insert if db.engine.dialect.name == "postgresql" else sqlite_insert
+    stmt = dialect_insert(MenuSchedule).values(rows)
+    return (stmt.on_conflict_do_update(
+                index_elements=[MenuSchedule.date, MenuSchedule.meal_type],
+                set_={"menu_id": stmt.excluded.menu_id, "notes": stmt.excluded.notes})
+            .returning(MenuSchedule.id, MenuSchedule.date, MenuSchedule.meal_type))
+
+
+def save_schedules(slots):
+    """
+    Write schedules and their item rows in a fixed number of statements.
+    Each (day, meal_type) slot is upserted on the unique (date, meal_type)
+    index, so re-saving a slot updates its one row in place (and keeps its
+    id); the slot's item rows are then replaced. Read held_usage() for the
+    slots before calling this: the stock the old rows held is not returned here.
+
+    slots: iterable of (day, meal_type, menu_id, notes, [(inventory_id, qty), ...]);
+    each (day, meal_type) must be unique.
+    Returns {(day, meal_type): schedule_id}.
+    """
+    slots = list(slots)
+    if not slots:
+        return {}
+    rows = [{"date": d, "meal_type": mt, "menu_id": mid, "notes": notes} for d, mt, mid, notes, _ in slots]
+    ids = {}
+    for i in range(0, len(rows), BATCH_ROWS):
+        ids.update({(r.date, r.meal_type): r.id
+                    for r in db.session.execute(_upsert_stmt(rows[i:i + BATCH_ROWS]))})
+
+    db.session.execute(
+        delete(MenuScheduleItem).where(MenuScheduleItem.schedule_id.in_(list(ids.values())))
+        .execution_options(synchronize_session=False)
+    )
+    item_rows = [
+        {"schedule_id": ids[(d, mt)], "inventory_id": inv_id, "quantity_used": q}
+        for d, mt, _, _, rows in slots for inv_id, q in rows
+    ]
+    if item_rows:
+        db.session.execute(insert(MenuScheduleItem), item_rows)
+    return ids
+
+
+def _label(key):
+    if isinstance(key, tuple):
+        return " ".join(k.strftime("%Y-%m-%d") if hasattr(k, "strftime") else str(k) for k in key)
+    return str(key)
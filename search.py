@@ -0,0 +1,148 @@
+# search.py — full-text search over residents.
+# SQLite: an external-content FTS5 table kept in sync by triggers.
+# Postgres: a GIN index on a to_tsvector() expression over the same columns.
+# Any other backend (or SQLite built without FTS5) falls back to ILIKE.
+
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import Column, Float, Integer, MetaData, Table, or_, text
+
+from models import db, Resident
+
+FTS_COLUMNS = ("first_name", "last_name", "diet", "allergies", "illnesses", "medications", "fluids")
+# bm25 weights, same order as FTS_COLUMNS: names rank above clinical text
+FTS_WEIGHTS = (10.0, 10.0, 4.0, 4.0, 1.0, 1.0, 2.0)
+
+# Kept off db.metadata so create_all() never tries to build it as a plain table.
+resident_fts = Table("resident_fts", MetaData(), Column("rowid", Integer), Column("rank", Float))
+
+_PG_DOCUMENT = " || ' ' || ".join(f"coalesce({c}, '')" for c in FTS_COLUMNS)
+
+_SQLITE_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS resident_fts USING fts5(
+            {", ".join(FTS_COLUMNS)}, content='resident', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS resident_fts_ai AFTER INSERT ON resident BEGIN
+            INSERT INTO resident_fts(rowid, {", ".join(FTS_COLUMNS)})
+            VALUES (new.id, {", ".join("new." + c for c in FTS_COLUMNS)});
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resident_fts_ad AFTER DELETE ON resident BEGIN
+            INSERT INTO resident_fts(resident_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', old.id, {", ".join("old." + c for c in FTS_COLUMNS)});
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS resident_fts_au AFTER UPDATE ON resident BEGIN
+            INSERT INTO resident_fts(resident_fts, rowid, {", ".join(FTS_COLUMNS)})
+            VALUES ('delete', old.id, {", ".join("old." + c for c in FTS_COLUMNS)});
+            INSERT INTO resident_fts(rowid, {", ".join(FTS_COLUMNS)})
+            VALUES (new.id, {", ".join("new." + c for c in FTS_COLUMNS)});
+        END""",
+]
+
+_PG_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_resident_search ON resident "
+    f"USING GIN (to_tsvector('simple'::regconfig, {_PG_DOCUMENT}))",
+]
+
+# engine url -> backend name ("sqlite" / "postgresql" / None when unavailable)
+_ready = {}
+
+
+def ensure_resident_index():
+    """Create the index (and SQLite triggers) once per process; returns the backend in use."""
+    engine = db.engine
+    key = str(engine.url)
+    if key in _ready:
+        return _ready[key]
+
+    backend = None
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite":
+                existed = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'resident_fts'"
+                )).first()
+                for stmt in _SQLITE_DDL:
+                    conn.execute(text(stmt))
+                if not existed:
+                    conn.execute(text("INSERT INTO resident_fts(resident_fts) VALUES ('rebuild')"))
+                backend = "sqlite"
+            elif dialect == "postgresql":
+                for stmt in _PG_DDL:
+                    conn.execute(text(stmt))
+                backend = "postgresql"
+    except Exception:
+        # No FTS5 in this SQLite build, or the resident table isn't created yet.
+        backend = None
+    _ready[key] = backend
+    return backend
+
+
+@contextmanager
+def bulk_load():
+    """
+    Wrap a bulk insert of residents: on SQLite the sync triggers are dropped
+    for its duration and the index rebuilt once at the end, which is far
+    cheaper than a trigger per row. Commits on the way out.
+    """
+    if ensure_resident_index() != "sqlite":
+        yield
+        db.session.commit()
+        return
+    for trigger in ("ai", "ad", "au"):
+        db.session.execute(text(f"DROP TRIGGER IF EXISTS resident_fts_{trigger}"))
+    try:
+        yield
+    except BaseException:
+        db.session.rollback()
+        raise
+    finally:
+        for stmt in _SQLITE_DDL[1:]:
+            db.session.execute(text(stmt))
+        db.session.execute(text("INSERT INTO resident_fts(resident_fts) VALUES ('rebuild')"))
+        db.session.commit()
+
+
+def rebuild_resident_index():
+    """Re-index every resident (after bulk loads that bypass the triggers)."""
+    if ensure_resident_index() == "sqlite":
+        db.session.execute(text("INSERT INTO resident_fts(resident_fts) VALUES ('rebuild')"))
+
+
+def _terms(q):
+    return re.findall(r"\w+", q or "", flags=re.UNICODE)
+
+
+def search_residents(q, query=None):
+    """
+    Filter `query` (default Resident.query) to residents matching `q`, best
+    matches first. Every term must match, and the last one matches as a prefix
+    so results narrow as the user types.
+    """
+    query = query if query is not None else Resident.query
+    terms = _terms(q)
+    if not terms:
+        return query
+
+    backend = ensure_resident_index()
+    if backend == "sqlite":
+        match = " ".join(f'"{t}"' for t in terms[:-1]) + f' "{terms[-1]}"*'
+        weights = ", ".join(str(w) for w in FTS_WEIGHTS)
+        return (query
+                .join(resident_fts, resident_fts.c.rowid == Resident.id)
+                .filter(text("resident_fts MATCH :fts_q"))
+                .order_by(text(f"bm25(resident_fts, {weights})"))
+                .params(fts_q=match.strip()))
+
+    if backend == "postgresql":
+        tsq = " & ".join(terms[:-1] + [terms[-1] + ":*"])
+        vec = f"to_tsvector('simple'::regconfig, {_PG_DOCUMENT})"
+        qry = "to_tsquery('simple'::regconfig, :fts_q)"
+        return (query
+                .filter(text(f"{vec} @@ {qry}"))
+                .order_by(text(f"ts_rank({vec}, {qry}) DESC"))
+                .params(fts_q=tsq))
+
+    like = f"%{q.strip()}%"
+    return query.filter(or_(*[getattr(Resident, c).ilike(like) for c in FTS_COLUMNS]))
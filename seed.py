@@ -0,0 +1,285 @@
+# seed.py — synthetic data for load and capacity testing (`flask seed`).
+# Generates residents (diets, allergies, fluids, medications), inventory items
+# across INVENTORY_UNITS with their opening ledger txns, menus with ingredients,
+# and schedule history with the items each meal used. The same seed and
+# options always produce the same rows: every table draws from its own
+# generator, so changing one volume doesn't reshuffle the others (schedule
+# dates are relative to --end, default today). Rows go in through Core
+# executemany in BATCH_ROWS chunks, so a million residents load in seconds.
+# Existing data is kept: ids continue after the current maximum, inventory
+# names that are already taken get a suffix, and occupied schedule slots
+# (date + meal) are skipped.
+
+import random
+import time
+import zlib
+from datetime import date, datetime, timedelta
+
+import click
+import numpy as np
+from sqlalchemy import func, text
+
+from models import (db, Resident, InventoryItem, InventoryTxn, Menu, MenuIngredient,
+                    MenuSchedule, MenuScheduleItem)
+from search import bulk_load
+
+BATCH_ROWS = 10_000
+MEALS = ("Breakfast", "Lunch", "Dinner")
+
+FIRST_NAMES = ["Mary", "James", "Patricia", "John", "Linda", "Robert", "Barbara", "Michael",
+               "Elizabeth", "William", "Dorothy", "Richard", "Margaret", "Joseph", "Ruth", "Charles",
+               "Helen", "Thomas", "Betty", "George", "Evelyn", "Frank", "Joan", "Harold", "Alice",
+               "Walter", "Shirley", "Arthur", "Virginia", "Raymond", "Lois", "Eugene", "Rosa", "Jose"]
+LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+              "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+              "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Perez", "Thompson", "White",
+              "Harris", "Sanchez", "Clark", "Ramirez", "Lewis", "Robinson", "Walker", "Young",
+              "Allen", "King", "Wright", "Scott", "Nguyen", "Hill", "Flores", "Green"]
+# (value, weight): most residents are on a regular diet with thin liquids
+DIETS = [("Regular", 40), ("Mechanical Soft", 12), ("Pureed", 6), ("Low Sodium", 10),
+         ("Diabetic / CCHO", 14), ("Renal", 5), ("Cardiac", 6), ("Gluten Free", 3),
+         ("Vegetarian", 2), ("Finger Foods", 2)]
+FLUIDS = [("Thin", 75), ("Nectar Thick", 12), ("Honey Thick", 8), ("Pudding Thick", 2),
+          ("Fluid Restriction 1500ml", 3)]
+ALLERGIES = ["Peanuts", "Tree nuts", "Shellfish", "Fish", "Milk", "Eggs", "Wheat", "Soy",
+             "Sesame", "Strawberries", "Tomatoes", "Pork"]
+ILLNESSES = ["Hypertension", "Type 2 diabetes", "CHF", "COPD", "Dementia", "CKD stage 3",
+             "Dysphagia", "Osteoporosis", "Parkinson's disease", "Atrial fibrillation"]
+MEDICATIONS = ["Metformin", "Lisinopril", "Atorvastatin", "Furosemide", "Warfarin",
+               "Levothyroxine", "Donepezil", "Amlodipine", "Omeprazole", "Insulin glargine"]
+NOTES = ["Prefers small portions", "Needs assistance with meals", "Dislikes spicy food",
+         "Eats in room", "Large portions", "Adaptive utensils"]
+# (name, units it is stocked in)
+FOODS = [("Oatmeal", ["kg", "boxes"]), ("Eggs", ["dozen", "cases"]), ("Milk", ["jugs", "liters"]),
+         ("Bread", ["loaves"]), ("Butter", ["kg", "packs"]), ("Chicken breast", ["kg", "cases"]),
+         ("Ground beef", ["kg"]), ("Salmon", ["kg"]), ("Shrimp", ["kg", "bags"]),
+         ("Rice", ["kg", "bags"]), ("Pasta", ["kg", "boxes"]), ("Potatoes", ["kg", "bags"]),
+         ("Carrots", ["kg", "bunches"]), ("Broccoli", ["kg", "heads"]), ("Green beans", ["cans", "kg"]),
+         ("Apples", ["kg", "pcs"]), ("Bananas", ["kg", "bunches"]), ("Orange juice", ["bottles", "liters"]),
+         ("Yogurt", ["packs", "pcs"]), ("Cheddar cheese", ["kg", "packs"]),
+         ("Peanut butter", ["jars"]), ("Tofu", ["packs"]), ("Flour", ["kg", "bags"]),
+         ("Sugar", ["kg", "bags"]), ("Tomato sauce", ["cans", "jars"]), ("Lettuce", ["heads"]),
+         ("Onions", ["kg", "bags"]), ("Almonds", ["g", "bags"]), ("Turkey", ["kg"]),
+         ("Pork loin", ["kg"]), ("Soy sauce", ["bottles"]), ("Strawberries", ["packs", "kg"]),
+         ("Applesauce", ["cans", "jars"]), ("Cereal", ["boxes"]), ("Coffee", ["kg", "bags"])]
+VARIANTS = ["", "Organic", "Frozen", "Low Sodium", "Bulk", "Fresh", "Whole Grain", "Store Brand"]
+DISHES = {
+    "Breakfast": ["Scrambled eggs", "Oatmeal bowl", "Pancakes", "French toast", "Breakfast burrito",
+                  "Yogurt parfait", "Cereal and fruit", "Egg muffin"],
+    "Lunch": ["Chicken salad", "Turkey sandwich", "Tomato soup", "Pasta primavera", "Rice bowl",
+              "Grilled cheese", "Beef chili", "Garden salad"],
+    "Dinner": ["Roast chicken", "Baked salmon", "Meatloaf", "Pork loin", "Shrimp stir fry",
+               "Spaghetti", "Turkey dinner", "Tofu curry"],
+}
+
+
+_DIET_P = [w / sum(w for _, w in DIETS) for _, w in DIETS]
+_FLUID_P = [w / sum(w for _, w in FLUIDS) for _, w in FLUIDS]
+
+
+def _rng(seed, table):
+    # One generator per table: a table's rows depend only on the seed and its own volume.
+    return random.Random(f"{seed}:{table}")
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _insert(model, rows, batch=BATCH_ROWS):
+    """executemany `rows` (an iterable of dicts) in chunks; returns the row count."""
+    stmt = model.__table__.insert()
+    chunk, n = [], 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch:
+            db.session.execute(stmt, chunk)
+            n += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(stmt, chunk)
+        n += len(chunk)
+    if n and db.session.get_bind().dialect.name == "postgresql":
+        # Rows carry explicit ids; move the serial past them for the app's own inserts
+        table = model.__tablename__
+        db.session.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                f"(SELECT max(id) FROM {table}))"))
+    return n
+
+
+# -------------------------- generators --------------------------
+def _picks(rng, n, choices, counts, p=None):
+    """n strings, each a ", "-joined pick of distinct `choices` (how many drawn from `counts`)."""
+    k = rng.choice(len(counts), size=n, p=p) if p else rng.integers(len(counts), size=n)
+    order = rng.random((n, len(choices))).argsort(axis=1)
+    return [", ".join(choices[j] for j in order[r, :counts[k[r]]]) or None for r in range(n)]
+
+
+def resident_rows(seed, count, start_id, batch=BATCH_ROWS):
+    # The one table that runs to millions of rows: drawn a batch at a time,
+    # column-wise with numpy, instead of a dozen random() calls per row.
+    rng = np.random.default_rng([seed, zlib.crc32(b"resident")])
+    birth0 = date(1925, 1, 1)
+    for lo in range(0, count, batch):
+        n = min(batch, count - lo)
+        first = rng.integers(len(FIRST_NAMES), size=n)
+        last = rng.integers(len(LAST_NAMES), size=n)
+        born = rng.integers(365 * 40, size=n)
+        diet = rng.choice(len(DIETS), size=n, p=_DIET_P)
+        fluids = rng.choice(len(FLUIDS), size=n, p=_FLUID_P)
+        allergies = _picks(rng, n, ALLERGIES, [0, 1, 2, 3], p=[0.60, 0.25, 0.11, 0.04])
+        illnesses = _picks(rng, n, ILLNESSES, [0, 1, 2, 3])
+        medications = _picks(rng, n, MEDICATIONS, [0, 1, 2, 3, 4])
+        note = rng.integers(len(NOTES), size=n)
+        has_note = rng.random(n) < 0.2
+        for r in range(n):
+            yield {
+                "id": start_id + lo + r,
+                "first_name": FIRST_NAMES[first[r]],
+                "last_name": LAST_NAMES[last[r]],
+                "birthday": birth0 + timedelta(days=int(born[r])),
+                "diet": DIETS[diet[r]][0],
+                "fluids": FLUIDS[fluids[r]][0],
+                "allergies": allergies[r],
+                "illnesses": illnesses[r],
+                "medications": medications[r],
+                "notes": NOTES[note[r]] if has_note[r] else None,
+            }
+
+
+def inventory_rows(rng, count, start_id, units, taken):
+    """(item rows, opening txn rows) for `count` items; `taken` is the set of names in use."""
+    items, txns = [], []
+    now = datetime.utcnow()
+    for i in range(start_id, start_id + count):
+        food, stocked_in = FOODS[(i - 1) % len(FOODS)]
+        variant = VARIANTS[(i - 1) // len(FOODS) % len(VARIANTS)]
+        lot = (i - 1) // (len(FOODS) * len(VARIANTS))
+        name = " ".join(p for p in (variant, food) if p) + (f" #{lot + 1}" if lot else "")
+        if name.lower() in taken:
+            name = f"{name} ({i})"
+        taken.add(name.lower())
+        unit = next((u for u in stocked_in if u in units), rng.choice(units))
+        threshold = float(rng.choice([5, 10, 20, 50]))
+        # About one item in eight sits at or below its low-stock threshold
+        qty = round(rng.uniform(0, threshold) if rng.random() < 0.125 else rng.uniform(threshold, 40 * threshold), 1)
+        items.append({"id": i, "name": name, "unit": unit, "quantity": qty,
+                      "low_stock_threshold": threshold})
+        if qty:
+            txns.append({"inventory_id": i, "delta": qty, "source": "opening", "created_at": now})
+    return items, txns
+
+
+def menu_rows(rng, count, start_id, item_ids):
+    """(menu rows, ingredient rows, {menu_id: [(inventory_id, qty), ...]})."""
+    menus, lines = [], {}
+    for i in range(start_id, start_id + count):
+        meal = MEALS[i % len(MEALS)]
+        dish = rng.choice(DISHES[meal])
+        menus.append({"id": i, "meal_type": meal, "title": f"{dish} #{i}",
+                      "description": f"{meal}: {dish.lower()} with sides"})
+        picks = rng.sample(item_ids, min(len(item_ids), rng.randint(3, 8)))
+        lines[i] = [(iid, float(rng.randint(1, 6))) for iid in picks]
+    ingredients = [{"menu_id": mid, "inventory_id": iid, "quantity": qty}
+                   for mid, rows in lines.items() for iid, qty in rows]
+    return menus, ingredients, lines
+
+
+def schedule_rows(rng, start, end, start_id, by_meal, lines, taken):
+    """
+    (schedule rows, item rows) for every free (date, meal) slot in [start, end].
+    by_meal: {meal_type: [menu_id, ...]}; taken: occupied (date, meal_type) slots.
+    """
+    schedules, items = [], []
+    sid = start_id
+    day = start
+    while day <= end:
+        for meal in MEALS:
+            if not by_meal.get(meal) or (day, meal) in taken:
+                continue
+            mid = rng.choice(by_meal[meal])
+            schedules.append({"id": sid, "date": day, "meal_type": meal, "menu_id": mid,
+                              "notes": "Seeded" if rng.random() < 0.05 else None})
+            items += [{"schedule_id": sid, "inventory_id": iid, "quantity_used": qty}
+                      for iid, qty in lines.get(mid, [])]
+            sid += 1
+        day += timedelta(days=1)
+    return schedules, items
+
+
+# -------------------------- loader --------------------------
+def generate(units, residents=0, items=0, menus=0, start=None, end=None, seed=1,
+             batch=BATCH_ROWS, echo=None):
+    """
+    Insert the requested volumes (schedules when start/end are given) and commit.
+    Returns {table: rows inserted}.
+    """
+    echo = echo or (lambda _msg: None)
+    counts = {}
+
+    def step(table, fn):
+        t0 = time.perf_counter()
+        counts[table] = fn()
+        echo(f"{table}: {counts[table]} rows in {time.perf_counter() - t0:.1f}s")
+
+    if residents:
+        # Search index triggers off during the load, one re-index pass after
+        with bulk_load():
+            step("resident", lambda: _insert(Resident, resident_rows(
+                seed, residents, _next_id(Resident), batch), batch))
+
+    if items:
+        taken = {n.lower() for (n,) in db.session.query(InventoryItem.name)}
+        item_rows, opening = inventory_rows(_rng(seed, "inventory"), items,
+                                            _next_id(InventoryItem), list(units), taken)
+        step("inventory_item", lambda: _insert(InventoryItem, item_rows, batch))
+        step("inventory_txn", lambda: _insert(InventoryTxn, opening, batch))
+        db.session.commit()
+
+    item_ids = [i for (i,) in db.session.query(InventoryItem.id).order_by(InventoryItem.id)]
+    if menus:
+        menu_list, ingredients, _ = menu_rows(_rng(seed, "menu"), menus, _next_id(Menu), item_ids)
+        step("menu", lambda: _insert(Menu, menu_list, batch))
+        step("menu_ingredient", lambda: _insert(MenuIngredient, ingredients, batch))
+        db.session.commit()
+
+    if start and end:
+        by_meal, lines = {}, {}
+        for mid, meal in db.session.query(Menu.id, Menu.meal_type).order_by(Menu.id):
+            by_meal.setdefault(meal, []).append(mid)
+        for mid, iid, qty in (db.session.query(MenuIngredient.menu_id, MenuIngredient.inventory_id,
+                                               MenuIngredient.quantity)
+                              .order_by(MenuIngredient.menu_id, MenuIngredient.id)):
+            lines.setdefault(mid, []).append((iid, qty))
+        taken = set(db.session.query(MenuSchedule.date, MenuSchedule.meal_type)
+                    .filter(MenuSchedule.date >= start, MenuSchedule.date <= end))
+        schedules, used = schedule_rows(_rng(seed, "schedule"), start, end,
+                                        _next_id(MenuSchedule), by_meal, lines, taken)
+        step("menu_schedule", lambda: _insert(MenuSchedule, schedules, batch))
+        step("menu_schedule_item", lambda: _insert(MenuScheduleItem, used, batch))
+        db.session.commit()
+
+    return counts
+
+
+def register_cli(app, units):
+    @app.cli.command("seed")
+    @click.option("--residents", default=1000, show_default=True)
+    @click.option("--items", default=300, show_default=True, help="Inventory items.")
+    @click.option("--menus", default=60, show_default=True)
+    @click.option("--years", default=2.0, show_default=True, help="Years of schedule history.")
+    @click.option("--end", help="Last scheduled day (YYYY-MM-DD); default today.")
+    @click.option("--seed", "seed_", default=1, show_default=True, help="Random seed.")
+    @click.option("--batch", default=BATCH_ROWS, show_default=True, help="Rows per INSERT batch.")
+    def seed_cmd(residents, items, menus, years, end, seed_, batch):
+        """Generate synthetic residents, inventory, menus and schedules."""
+        last = datetime.strptime(end, "%Y-%m-%d").date() if end else date.today()
+        first = last - timedelta(days=max(0, round(years * 365)) - 1)
+        t0 = time.perf_counter()
+        counts = generate(units, residents=residents, items=items, menus=menus,
+                          start=first if years > 0 else None, end=last, seed=seed_,
+                          batch=batch, echo=click.echo)
+        click.echo(f"Seeded {sum(counts.values())} rows in {time.perf_counter() - t0:.1f}s "
+                   f"(seed {seed_}).")
+
+    return seed_cmd
@@ -0,0 +1,105 @@
+# sqlitecache.py — least-recently-used cache table in a small SQLite file.
+# Base for the chatbot's response cache and the rendered-page cache: every
+# gunicorn worker opens the same file, so entries, evictions and hit/miss
+# counters are shared. Entries expire `ttl` seconds after they were written;
+# beyond `max_entries` the least recently used ones are evicted on each put.
+# Subclasses name their table and value columns, and can keep extra counters.
+# The file and tables are created on first use, not when the app starts.
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+
+class SQLiteLRU:
+    table = "entry"
+    # (name, SQLite type) of the stored values, besides key/created/last_used
+    columns = (("value", "TEXT NOT NULL"),)
+    meta = "meta"
+    counters = ("hits", "misses")
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._names = ", ".join(f'"{name}"' for name, _ in self.columns)
+        self._ready = False
+
+    def _create(self, conn):
+        conn.execute("PRAGMA journal_mode=WAL")
+        with conn:
+            conn.execute(f"""CREATE TABLE IF NOT EXISTS {self.table} (
+                                 key TEXT PRIMARY KEY,
+                                 {"".join(f'"{n}" {t}, ' for n, t in self.columns)}
+                                 created REAL NOT NULL, last_used REAL NOT NULL)""")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table}_last_used ON {self.table} (last_used)")
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.meta} (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.executemany(f"INSERT OR IGNORE INTO {self.meta} VALUES (?, 0)", [(c,) for c in self.counters])
+
+    @contextmanager
+    def connect(self):
+        # One short-lived connection per call: safe across threads and forks.
+        if not self._ready:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            if not self._ready:
+                self._create(conn)
+                self._ready = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def counter(self, conn, name):
+        return conn.execute(f"SELECT value FROM {self.meta} WHERE name = ?", (name,)).fetchone()[0]
+
+    def bump(self, conn, name):
+        conn.execute(f"UPDATE {self.meta} SET value = value + 1 WHERE name = ?", (name,))
+
+    def lookup(self, conn, key):
+        """The entry's values as a tuple, or None if missing or expired; counts a hit or miss."""
+        now = time.time()
+        row = conn.execute(f"SELECT {self._names} FROM {self.table} WHERE key = ? AND created >= ?",
+                           (key, now - self.ttl)).fetchone()
+        if row:
+            conn.execute(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", (now, key))
+        self.bump(conn, "hits" if row else "misses")
+        return row
+
+    def get(self, key):
+        with self.connect() as conn:
+            return self.lookup(conn, key)
+
+    def put(self, key, values, only_if=None):
+        """
+        Store `values` (one per column) under `key`, then expire and evict.
+        only_if: optional (SQL condition, params) the write is conditional on.
+        """
+        now = time.time()
+        cond, params = only_if or ("1", ())
+        with self.connect() as conn:
+            conn.execute(
+                f"""INSERT OR REPLACE INTO {self.table} (key, {self._names}, created, last_used)
+                    SELECT ?, {", ".join("?" * len(self.columns))}, ?, ? WHERE {cond}""",
+                (key, *values, now, now, *params),
+            )
+            conn.execute(f"DELETE FROM {self.table} WHERE created < ?", (now - self.ttl,))
+            conn.execute(
+                f"""DELETE FROM {self.table} WHERE key IN (
+                        SELECT key FROM {self.table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)""",
+                (self.max_entries,),
+            )
+
+    def stats(self):
+        with self.connect() as conn:
+            counts = dict(conn.execute(f"SELECT name, value FROM {self.meta}"))
+            entries = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        return {"hits": counts.get("hits", 0), "misses": counts.get("misses", 0), "entries": entries,
+                "ttl": self.ttl, "max_entries": self.max_entries}
+
+    def clear(self):
+        with self.connect() as conn:
+            conn.execute(f"DELETE FROM {self.table}")
+            conn.execute(f"UPDATE {self.meta} SET value = 0 WHERE name IN ('hits', 'misses')")
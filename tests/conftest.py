@@ -0,0 +1,36 @@
+import time
+
+import pytest
+
+from app import create_app
+from models import db, User
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """create_app() on a fresh SQLite file, with the page cache off."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("DATABASE_URL", "sqlite:///" + str(tmp_path / "app.db"))
+    monkeypatch.setenv("PAGE_CACHE_ENABLED", "0")
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        manager = User(username="manager", role="Manager")
+        manager.set_password("x")
+        db.session.add(manager)
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    """Test client logged in as the manager."""
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s["user"] = {"id": 1, "username": "manager", "role": "Manager", "first_name": "",
+                     "last_name": "", "must_change_password": False, "checked_at": int(time.time())}
+    return client
@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+import forecast
+from models import db, InventoryItem, MenuSchedule, MenuScheduleItem
+
+TODAY = date(2030, 1, 7)
+
+
+def _item(quantity, per_day, days):
+    """An item whose stock already has `per_day` deducted for days 1..`days`."""
+    it = InventoryItem(name=f"item {quantity}", unit="kg", quantity=quantity - per_day * days)
+    db.session.add(it)
+    db.session.flush()
+    for d in range(1, days + 1):
+        s = MenuSchedule(date=TODAY + timedelta(days=d), meal_type="Lunch")
+        s.items = [MenuScheduleItem(inventory_id=it.id, quantity_used=per_day)]
+        db.session.add(s)
+    return it
+
+
+def test_stockout_within_the_schedule(app):
+    with app.app_context():
+        it = _item(5, per_day=2, days=10)
+        db.session.commit()
+        row = forecast.stockout_forecast(10, today=TODAY).loc[it.id]
+        assert row.on_hand == 5
+        assert row.days_until_stockout == 3   # 3, 1, then -1 at the end of day 3
+        assert not row.extrapolated
+
+
+def test_stockout_extrapolated_from_the_last_scheduled_day(app):
+    with app.app_context():
+        it = _item(100, per_day=2, days=10)
+        db.session.commit()
+        row = forecast.stockout_forecast(10, today=TODAY).loc[it.id]
+        # 80 left after day 10, 2 a day: gone at the end of day 50
+        assert row.daily_rate == 2
+        assert row.days_until_stockout == 50
+        assert row.stockout_date.date() == TODAY + timedelta(days=50)
+        assert row.extrapolated
+
+
+def test_slow_movers_have_no_stockout_date(app):
+    with app.app_context():
+        it = _item(100000, per_day=0.5, days=10)
+        db.session.commit()
+        row = forecast.stockout_forecast(10, today=TODAY).loc[it.id]
+        assert pd.isna(row.days_until_stockout) and pd.isna(row.stockout_date)
+        assert not row.extrapolated
+        [out] = forecast.forecast_rows(forecast.stockout_forecast(10, today=TODAY), horizon=10)
+        assert out["stockout_date"] is None
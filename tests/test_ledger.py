@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func
+
+import ledger
+from models import db, InventoryItem, InventoryTxn, InventorySnapshot
+
+
+def _item(quantity, name="Flour"):
+    """An item as it predates the ledger: a balance and no txns."""
+    it = InventoryItem(name=name, unit="kg", quantity=quantity)
+    db.session.add(it)
+    db.session.commit()
+    return it.id
+
+
+def _txns(item_id):
+    return [(t.source, t.delta) for t in InventoryTxn.query.filter_by(inventory_id=item_id)
+            .order_by(InventoryTxn.id)]
+
+
+def _quantity(item_id):
+    return db.session.query(InventoryItem.quantity).filter_by(id=item_id).scalar()
+
+
+def _ledger_sum(item_id):
+    return db.session.query(func.coalesce(func.sum(InventoryTxn.delta), 0.0)).filter(
+        InventoryTxn.inventory_id == item_id).scalar()
+
+
+def test_record_opens_legacy_items_first(app):
+    with app.app_context():
+        iid = _item(50)
+        ledger.record(iid, 1, "bump")
+        ledger.record(iid, -3, "bump")
+        db.session.commit()
+        assert _txns(iid) == [("opening", 50), ("bump", 1), ("bump", -3)]
+        assert _quantity(iid) == _ledger_sum(iid) == 48
+
+
+def test_append_many_opens_legacy_items_at_their_prior_balance(app):
+    with app.app_context():
+        iid = _item(10)
+        # append_many's deltas were already applied by the caller
+        db.session.execute(db.update(InventoryItem).where(InventoryItem.id == iid)
+                           .values(quantity=InventoryItem.quantity - 4))
+        ledger.append_many([(iid, -2.5, "schedule", 1), (iid, -1.5, "schedule", 2)])
+        db.session.commit()
+        assert _txns(iid) == [("opening", 10), ("schedule", -2.5), ("schedule", -1.5)]
+        assert _quantity(iid) == _ledger_sum(iid) == 6
+
+
+def test_close_item_nets_history_to_zero(app):
+    with app.app_context():
+        iid = _item(7)
+        ledger.close_item(db.session.get(InventoryItem, iid))
+        db.session.commit()
+        assert _txns(iid) == [("opening", 7), ("delete", -7)]
+
+
+@pytest.mark.parametrize("delta", [float("nan"), float("inf"), float("-inf")])
+def test_non_finite_deltas_are_refused(app, delta):
+    with app.app_context():
+        iid = _item(5)
+        with pytest.raises(ValueError):
+            ledger.record(iid, delta, "bump")
+        with pytest.raises(ValueError):
+            ledger.append_many([(iid, delta, "schedule", 1)])
+        db.session.rollback()
+        assert _quantity(iid) == 5
+        assert _txns(iid) == []
+
+
+@pytest.mark.parametrize("delta", ["nan", "inf", "abc"])
+def test_bump_form_rejects_non_numbers(app, client, delta):
+    with app.app_context():
+        iid = _item(5)
+    resp = client.post(f"/inventory/{iid}/bump", data={"delta": delta})
+    assert resp.status_code == 302
+    with client.session_transaction() as s:
+        assert [cat for cat, _ in s.pop("_flashes", [])] == ["error"]
+    with app.app_context():
+        assert _quantity(iid) == 5
+        assert _txns(iid) == []
+
+
+def test_compact_and_balance_as_of(app):
+    day = datetime(2030, 1, 7)
+    with app.app_context():
+        iid = _item(0)
+        for hours, delta in ((1, 10), (2, -4), (5, 3)):
+            ledger.record(iid, delta, "bump")
+            db.session.flush()
+            db.session.execute(db.update(InventoryTxn).where(InventoryTxn.id == db.select(
+                func.max(InventoryTxn.id)).scalar_subquery()).values(created_at=day + timedelta(hours=hours)))
+        db.session.commit()
+
+        assert ledger.compact(day + timedelta(hours=3)) == 1
+        assert ledger.compact(day + timedelta(hours=3)) == 0   # nothing moved since
+        db.session.commit()
+        snap = InventorySnapshot.query.filter_by(inventory_id=iid).one()
+        assert snap.balance == 6
+
+        assert ledger.balance_as_of(iid, day) == 0
+        assert ledger.balance_as_of(iid, day + timedelta(hours=1)) == 10
+        assert ledger.balance_as_of(iid, day + timedelta(hours=4)) == 6
+        assert ledger.balance_as_of(iid, day + timedelta(hours=6)) == 9 == _quantity(iid)
+
+
+def test_rebuild_balances_restores_the_ledger_sum(app):
+    with app.app_context():
+        iid = _item(5)
+        other = _item(3, name="Milk")
+        ledger.record(iid, 2, "bump")
+        db.session.commit()
+        ledger.compact()
+        db.session.execute(db.update(InventoryItem).where(InventoryItem.id == iid).values(quantity=99))
+        db.session.commit()
+
+        assert ledger.ensure_opening_balances() == 1   # Milk had no txns
+        assert ledger.rebuild_balances() == 1
+        db.session.commit()
+        assert _quantity(iid) == _ledger_sum(iid) == 7
+        assert _quantity(other) == _ledger_sum(other) == 3
@@ -0,0 +1,14 @@
+import pytest
+
+from models import db, User
+from pagination import RankedPage, decode_cursor
+
+
+@pytest.mark.parametrize("after", [None, [-5], ["2"], [True], []])
+def test_ranked_page_starts_over_on_invalid_offsets(app, after):
+    with app.app_context():
+        db.session.add_all(User(username=f"cook{i}", role="Cook", password_hash="x") for i in range(3))
+        db.session.commit()
+        page = RankedPage(User.query.order_by(User.id), after, per_page=2)
+        assert [u.username for u in page] == ["manager", "cook0"]
+        assert decode_cursor(page.next_cursor) == [2]
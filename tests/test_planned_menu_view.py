@@ -0,0 +1,60 @@
+from datetime import date
+
+from sqlalchemy import event
+
+from models import db, InventoryItem, Menu, MenuIngredient, MenuSchedule, MenuScheduleItem
+
+DAY = date(2030, 1, 7)
+
+
+def _schedule_day(ingredients):
+    """Schedule all three meals on DAY, each using `ingredients` distinct items."""
+    for meal in ("Breakfast", "Lunch", "Dinner"):
+        items = [InventoryItem(name=f"{meal} item {i}", unit="kg", quantity=100)
+                 for i in range(ingredients)]
+        db.session.add_all(items)
+        db.session.flush()
+        menu = Menu(meal_type=meal, title=f"{meal} menu")
+        menu.ingredients = [MenuIngredient(inventory_id=it.id, quantity=1) for it in items]
+        schedule = MenuSchedule(date=DAY, meal_type=meal, menu=menu)
+        schedule.items = [MenuScheduleItem(inventory_id=it.id, quantity_used=1) for it in items]
+        db.session.add(schedule)
+    db.session.commit()
+
+
+def _statements(app, client):
+    with app.app_context():
+        engine = db.engine
+    seen = []
+
+    def count(conn, cursor, statement, *args):
+        seen.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        resp = client.get(f"/menu/planned/{DAY.isoformat()}")
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert resp.status_code == 200
+    return seen
+
+
+def _warm_and_count(app, client, ingredients):
+    with app.app_context():
+        _schedule_day(ingredients)
+    # The first request also loads the allergen index; measure the steady state.
+    _statements(app, client)
+    return len(_statements(app, client))
+
+
+def test_query_count_flat_in_ingredient_count(app, client):
+    few = _warm_and_count(app, client, 2)
+    with app.app_context():
+        MenuScheduleItem.query.delete()
+        MenuSchedule.query.delete()
+        MenuIngredient.query.delete()
+        Menu.query.delete()
+        InventoryItem.query.delete()
+        db.session.commit()
+    many = _warm_and_count(app, client, 25)
+    assert few == many
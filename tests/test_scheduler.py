@@ -0,0 +1,46 @@
+import pytest
+from sqlalchemy import func
+
+from models import db, InventoryItem, InventoryTxn, Menu, MenuIngredient, MenuSchedule, MenuScheduleItem
+
+
+@pytest.mark.parametrize("path, form", [
+    ("/menu/scheduler", {"date": "2030-01-07", "Lunch_menu": "abc"}),
+    ("/menu/scheduler/batch", {"start": "2030-01-07", "end": "2030-01-08", "2030-01-08_Dinner_menu": "1x"}),
+])
+def test_invalid_menu_id_is_rejected(app, client, path, form):
+    resp = client.post(path, data=form)
+    assert resp.status_code == 302
+    with client.session_transaction() as s:
+        flashes = s.pop("_flashes", [])
+    assert [cat for cat, _ in flashes] == ["error"]
+    with app.app_context():
+        assert MenuSchedule.query.count() == 0
+
+
+def _ledger_sum(item_id):
+    return db.session.query(func.coalesce(func.sum(InventoryTxn.delta), 0.0)).filter(
+        InventoryTxn.inventory_id == item_id).scalar()
+
+
+def test_resaving_a_slot_returns_the_old_usage(app, client):
+    with app.app_context():
+        flour = InventoryItem(name="Flour", unit="kg", quantity=3)
+        db.session.add(flour)
+        db.session.flush()
+        menu = Menu(meal_type="Breakfast", title="Pancakes")
+        menu.ingredients = [MenuIngredient(inventory_id=flour.id, quantity=2.5)]
+        db.session.add(menu)
+        db.session.commit()
+        flour_id, menu_id = flour.id, menu.id
+
+    form = {"date": "2030-01-07", "Breakfast_menu": str(menu_id)}
+    for _ in range(3):
+        # The re-saves only fit if the first save's 2.5kg counts as available
+        client.post("/menu/scheduler", data=form)
+        with client.session_transaction() as s:
+            assert [cat for cat, _ in s.pop("_flashes", [])] == ["success"]
+        with app.app_context():
+            assert db.session.get(InventoryItem, flour_id).quantity == 0.5
+            assert _ledger_sum(flour_id) == 0.5
+            assert MenuScheduleItem.query.count() == 1
@@ -0,0 +1,50 @@
+# traycards.py — tray cards for every resident in one streamed document.
+# The day's menus come from one joined query, residents off one yield_per
+# cursor, and each card's allergy warnings from the allergen index (cached in
+# memory), so a batch costs the same few queries for 15 residents or 1500.
+# Cards are yielded one at a time for stream_template.
+
+from models import db, Resident, Menu, MenuSchedule
+from search import search_residents
+
+YIELD_PER = 200
+MEAL_ORDER = {"Breakfast": 0, "Lunch": 1, "Dinner": 2}
+
+
+def day_menus(day):
+    """[{"meal", "menu_id", "title"}] scheduled for `day`, breakfast first."""
+    rows = (db.session.query(MenuSchedule.meal_type, MenuSchedule.menu_id, Menu.title)
+            .outerjoin(Menu, Menu.id == MenuSchedule.menu_id)
+            .filter(MenuSchedule.date == day)
+            .all())
+    rows.sort(key=lambda r: MEAL_ORDER.get(r.meal_type, 99))
+    return [{"meal": meal, "menu_id": mid, "title": title or "(untitled)"} for meal, mid, title in rows]
+
+
+def tray_cards(meals, allergen_idx, q=""):
+    """
+    One dict per resident (name order) with diet, fluids, allergies and the
+    day's meals, each flagged with the ingredients that resident must avoid.
+    `q` narrows the batch with the residents search (name, diet, allergies...).
+    """
+    # {menu_id: {resident_id: [item names]}}
+    avoid = {mid: {c["resident_id"]: c["items"] for c in conflicts}
+             for mid, conflicts in allergen_idx.conflicts_for(m["menu_id"] for m in meals).items()}
+
+    query = db.session.query(Resident.id, Resident.first_name, Resident.last_name, Resident.birthday,
+                             Resident.diet, Resident.fluids, Resident.allergies, Resident.notes)
+    if q:
+        query = search_residents(q, query).order_by(None)
+    query = query.order_by(Resident.last_name, Resident.first_name, Resident.id)
+
+    for r in query.yield_per(YIELD_PER):
+        yield {
+            "id": r.id,
+            "name": f"{r.first_name} {r.last_name}".strip(),
+            "birthday": r.birthday,
+            "diet": r.diet,
+            "fluids": r.fluids,
+            "allergies": r.allergies,
+            "notes": r.notes,
+            "meals": [dict(m, avoid=avoid.get(m["menu_id"], {}).get(r.id, [])) for m in meals],
+        }
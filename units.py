@@ -0,0 +1,194 @@
+# units.py — unit conversion for ingredient quantities.
+# Every known unit gets a row/column in one precomputed matrix: M[a, b] is how
+# many `b` make one `a` (NaN when they measure different things). Items with
+# pack sizes ("1 cases = 24 cans") get their own closed copy of the matrix.
+# Converting a batch of quantities into their items' stock units is then a
+# couple of fancy-indexing passes instead of a guess per row.
+
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy.orm import object_session
+
+from commitsync import CommitSync
+from models import db, PackSize
+
+# unit -> (dimension, size in the dimension's base unit)
+STANDARD = {
+    "g": ("mass", 1.0), "kg": ("mass", 1000.0), "mg": ("mass", 0.001),
+    "lb": ("mass", 453.59237), "oz": ("mass", 28.349523125),
+    "ml": ("volume", 1.0), "liters": ("volume", 1000.0),
+    "tsp": ("volume", 4.92892159375), "tbsp": ("volume", 14.78676478125),
+    "cups": ("volume", 236.5882365), "quarts": ("volume", 946.352946),
+    "gallons": ("volume", 3785.411784),
+    "pcs": ("count", 1.0), "dozen": ("count", 12.0),
+}
+
+# Pack units only convert through an item's pack sizes.
+PACK_UNITS = ("bags", "cases", "cans", "jugs", "bunches", "heads", "loaves",
+              "packs", "bottles", "jars", "boxes")
+
+ALIASES = {
+    "gram": "g", "grams": "g", "gr": "g", "kilogram": "kg", "kilograms": "kg", "kgs": "kg",
+    "milligram": "mg", "milligrams": "mg",
+    "lbs": "lb", "pound": "lb", "pounds": "lb", "ounce": "oz", "ounces": "oz",
+    "l": "liters", "liter": "liters", "litre": "liters", "litres": "liters", "ltr": "liters",
+    "milliliter": "ml", "milliliters": "ml", "millilitre": "ml", "millilitres": "ml",
+    "teaspoon": "tsp", "teaspoons": "tsp", "tablespoon": "tbsp", "tablespoons": "tbsp",
+    "cup": "cups", "quart": "quarts", "qt": "quarts", "gallon": "gallons", "gal": "gallons",
+    "pc": "pcs", "piece": "pcs", "pieces": "pcs", "each": "pcs", "ea": "pcs", "doz": "dozen",
+    "bag": "bags", "case": "cases", "can": "cans", "jug": "jugs", "bunch": "bunches",
+    "head": "heads", "loaf": "loaves", "pack": "packs", "pkg": "packs", "bottle": "bottles",
+    "jar": "jars", "box": "boxes",
+}
+
+
+def normalize(unit):
+    """Canonical spelling of a unit ("Kilograms" -> "kg"); unknown units pass through lower-cased."""
+    u = (unit or "").strip().lower().rstrip(".")
+    return ALIASES.get(u, u)
+
+
+def _close(m):
+    """Fill in every conversion reachable through chains of known ones (Floyd-Warshall)."""
+    m = m.copy()
+    for k in range(len(m)):
+        via = m[:, k:k + 1] * m[k:k + 1, :]
+        m = np.where(np.isnan(m), via, m)
+    return m
+
+
+class UnitTable:
+    def __init__(self, extra_units=(), max_age=300):
+        self.max_age = max_age
+        self._extra = tuple(extra_units)
+        self._lock = threading.Lock()
+        self._built_at = 0.0
+        self._matrix = None
+        self._items = {}          # inventory_id -> closed matrix including its pack sizes
+        self.units = []
+        self.index = {}
+
+    # ---- building ----
+    def _base(self, units):
+        index = {u: i for i, u in enumerate(units)}
+        m = np.full((len(units), len(units)), np.nan)
+        np.fill_diagonal(m, 1.0)
+        dims = [STANDARD.get(u) for u in units]
+        for i, a in enumerate(dims):
+            for j, b in enumerate(dims):
+                if a and b and a[0] == b[0]:
+                    m[i, j] = a[1] / b[1]
+        return index, m
+
+    def build(self):
+        """One query for the pack sizes, then every matrix this table will need."""
+        packs = db.session.query(PackSize.inventory_id, PackSize.unit,
+                                 PackSize.quantity, PackSize.per_unit).all()
+        units = list(STANDARD) + [u for u in PACK_UNITS if u not in STANDARD]
+        for u in [normalize(u) for u in self._extra] + [normalize(u) for p in packs for u in (p.unit, p.per_unit)]:
+            if u and u not in units:
+                units.append(u)
+        index, base = self._base(units)
+
+        by_item = {}
+        for iid, unit, qty, per_unit in packs:
+            if qty and qty > 0:
+                by_item.setdefault(iid, []).append((index[normalize(unit)], qty, index[normalize(per_unit)]))
+        items = {}
+        for iid, edges in by_item.items():
+            m = base.copy()
+            for a, qty, b in edges:
+                m[a, b] = qty
+                m[b, a] = 1.0 / qty
+            items[iid] = _close(m)
+
+        with self._lock:
+            self.units, self.index, self._matrix, self._items = units, index, base, items
+            self._built_at = time.time()
+
+    def invalidate(self):
+        self._built_at = 0.0
+
+    def apply(self, changes, stale):
+        # Pack sizes changed (committed in this process): rebuild on next use
+        self.invalidate()
+
+    def _ensure(self):
+        if self._matrix is None or time.time() - self._built_at > self.max_age:
+            self.build()
+
+    # ---- lookups ----
+    def factor(self, from_unit, to_unit, item_id=None):
+        """How many `to_unit` make one `from_unit` (for this item), or None."""
+        self._ensure()
+        a, b = normalize(from_unit), normalize(to_unit)
+        if not a or a == b:
+            return 1.0
+        i, j = self.index.get(a), self.index.get(b)
+        if i is None or j is None:
+            return None
+        f = self._items.get(item_id, self._matrix)[i, j]
+        return None if np.isnan(f) else float(f)
+
+    def convert(self, qty, from_unit, to_unit, item_id=None):
+        f = self.factor(from_unit, to_unit, item_id)
+        return None if f is None else (qty or 0.0) * f
+
+    def to_stock(self, item_ids, units, stock_units, quantities):
+        """
+        Convert many quantities at once: quantities[k] in units[k] into
+        stock_units[k] for item_ids[k]. A blank unit means "already in the stock
+        unit". Returns a float array with NaN where no conversion is known.
+        """
+        self._ensure()
+        n = len(quantities)
+        src = [normalize(u) for u in units]
+        dst = [normalize(u) for u in stock_units]
+        fi = np.fromiter((self.index.get(u, -1) for u in src), dtype=np.intp, count=n)
+        ti = np.fromiter((self.index.get(u, -1) for u in dst), dtype=np.intp, count=n)
+        known = (fi >= 0) & (ti >= 0)
+
+        f = np.full(n, np.nan)
+        f[known] = self._matrix[fi[known], ti[known]]
+        if self._items:
+            ids = np.asarray(item_ids)
+            for iid in set(ids[known].tolist()) & self._items.keys():
+                rows = known & (ids == iid)
+                f[rows] = self._items[iid][fi[rows], ti[rows]]
+        same = np.fromiter((not a or a == b for a, b in zip(src, dst)), dtype=bool, count=n)
+        f[same] = 1.0
+        return np.asarray(quantities, dtype=float) * f
+
+    def choices(self, stock_unit, item_id=None):
+        """Units a quantity of this item can be entered in (the stock unit first)."""
+        self._ensure()
+        s = normalize(stock_unit)
+        j = self.index.get(s)
+        if j is None:
+            return [stock_unit] if stock_unit else []
+        col = self._items.get(item_id, self._matrix)[:, j]
+        return [s] + [u for u, f in zip(self.units, col) if u != s and not np.isnan(f)]
+
+
+# -------------------------- ORM event wiring --------------------------
+_sync = CommitSync("units")
+
+
+def _on_pack(mapper, connection, target):
+    _sync.stale(object_session(target), "packs")
+
+
+def _wire_events():
+    _sync.wire([(PackSize, name, _on_pack) for name in ("after_insert", "after_update", "after_delete")])
+
+
+def init_app(app, extra_units=()):
+    # Pack sizes changed in another gunicorn worker are picked up after this many seconds
+    app.config.setdefault("UNITS_MAX_AGE", int(os.getenv("UNITS_MAX_AGE", "300")))
+    _wire_events()
+    table = _sync.register(UnitTable(extra_units=extra_units, max_age=app.config["UNITS_MAX_AGE"]))
+    app.extensions["units"] = table
+    return table